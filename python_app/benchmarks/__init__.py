@@ -0,0 +1 @@
+# Бенчмарки: запуск из каталога python_app, например `python -m benchmarks.middleware`
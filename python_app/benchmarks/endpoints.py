@@ -0,0 +1,268 @@
+"""
+Нагрузочный прогон эндпоинтов: пропускная способность и p50/p95/p99 с трейсингом и без,
+результаты в JSON и сравнение с сохранённым baseline.
+
+In-process (ASGI transport, lifespan приложения; нужны Postgres и Redis из настроек,
+second-app и цель /chain поднимаются заглушкой на localhost):
+
+    python -m benchmarks.endpoints --requests 2000 --concurrency 20
+    python -m benchmarks.endpoints --save-baseline
+
+Против запущенного сервера (трейсинг переключается на его стороне, режим один - "remote"):
+
+    python -m benchmarks.endpoints --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# (имя, метод, путь, параметры запроса)
+SCENARIOS = [
+    ("root", "GET", "/", None),
+    ("entities", "GET", "/entities/", {"limit": 100}),
+    ("entities-asyncpg", "GET", "/entities-asyncpg/", {"limit": 100}),
+    ("redis-get", "GET", "/redis-get/", None),
+    ("second-app", "GET", "/second-app/", {"entity_id": 1}),
+    ("chain", "GET", "/chain", None),
+]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(q / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, method: str, path: str, params: dict | None, requests: int, concurrency: int
+) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+async def run_all(client: httpx.AsyncClient, requests: int, concurrency: int, warmup: int) -> dict:
+    # Данные для чтения: несколько сущностей и значение в Redis
+    for i in range(10):
+        await client.post("/entities/", json={"name": f"bench-{i}", "description": "benchmark"})
+    await client.post("/redis-set/", params={"value": "benchmark"})
+
+    results = {}
+    for name, method, path, params in SCENARIOS:
+        await run_scenario(client, method, path, params, warmup, concurrency)
+        results[name] = await run_scenario(client, method, path, params, requests, concurrency)
+        print(format_row(name, results[name]), file=sys.stderr)
+    return results
+
+
+def stub_downstream_app():
+    # Заглушка second-app и цели /chain: отвечает сразу, чтобы мерить только наш сервис
+    from fastapi import FastAPI
+
+    stub = FastAPI()
+
+    @stub.get("/")
+    async def root():
+        return {"ok": True}
+
+    @stub.get("/entity/")
+    async def entity(entity_id: int):
+        return {"entity_id": entity_id, "value": "stub"}
+
+    return stub
+
+
+async def start_stub_server(port: int):
+    import uvicorn
+
+    ready = asyncio.Event()
+
+    class StubServer(uvicorn.Server):
+        async def startup(self, sockets=None) -> None:
+            await super().startup(sockets)
+            # Сигнал готовности вместо опроса started в цикле
+            if self.started:
+                ready.set()
+
+    server = StubServer(uvicorn.Config(stub_downstream_app(), port=port, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    waiter = asyncio.create_task(ready.wait())
+    await asyncio.wait({waiter, task}, return_when=asyncio.FIRST_COMPLETED)
+    if not ready.is_set():
+        # serve() завершился, не поднявшись (порт занят и т.п.)
+        waiter.cancel()
+        task.result()
+        raise RuntimeError("Stub downstream server failed to start")
+    return server, task
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_in_process(requests: int, concurrency: int, warmup: int) -> dict:
+    port = free_port()
+    os.environ["SECOND_APP_HOST"] = "127.0.0.1"
+    os.environ["SECOND_APP_PORT"] = str(port)
+    os.environ["CHAIN_TARGET_URL"] = f"http://127.0.0.1:{port}"
+
+    stub_server, stub_task = await start_stub_server(port)
+
+    # Импорт после подмены адресов: settings читаются при импорте
+    from otel_py_example.app import create_app
+
+    app = create_app()
+
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                return await run_all(client, requests, concurrency, warmup)
+    finally:
+        stub_server.should_exit = True
+        await stub_task
+
+
+async def run_remote(url: str, requests: int, concurrency: int, warmup: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        return await run_all(client, requests, concurrency, warmup)
+
+
+def run_child(tracing: bool, args: argparse.Namespace) -> dict:
+    # Инструментация глобальна для процесса, поэтому каждый режим - отдельный интерпретатор
+    env = dict(os.environ, OTEL_SDK_DISABLED="false" if tracing else "true")
+    print(f"tracing {'on' if tracing else 'off'}:", file=sys.stderr)
+    # Результат через файл: stdout занят логами приложения (echo SQLAlchemy и т.п.)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "result.json"
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.endpoints",
+            "--child",
+            "--output",
+            str(output),
+            "--requests",
+            str(args.requests),
+            "--concurrency",
+            str(args.concurrency),
+            "--warmup",
+            str(args.warmup),
+        ]
+        subprocess.run(command, env=env, check=True)
+        return json.loads(output.read_text())
+
+
+def format_row(name: str, stats: dict) -> str:
+    return (
+        f"  {name:>18}: {stats['rps']:8.1f} rps  p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f}  "
+        f"p99 {stats['p99_ms']:7.2f} ms  errors {stats['errors']}"
+    )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for mode, scenarios in results.items():
+        for name, stats in scenarios.items():
+            base = baseline.get(mode, {}).get(name)
+            if base is None:
+                continue
+            if stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{mode}/{name}: p95 {base['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms")
+            if stats["rps"] < base["rps"] * (1 - tolerance):
+                regressions.append(f"{mode}/{name}: rps {base['rps']:.1f} -> {stats['rps']:.1f}")
+            if stats["errors"] > base["errors"]:
+                regressions.append(f"{mode}/{name}: errors {base['errors']} -> {stats['errors']}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="Бенчмарк запущенного сервера вместо in-process")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "latest.json")
+    parser.add_argument("--baseline", type=Path, default=RESULTS_DIR / "baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение p95/rps (доля)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        results = asyncio.run(run_in_process(args.requests, args.concurrency, args.warmup))
+        args.output.write_text(json.dumps(results))
+        return 0
+
+    if args.url:
+        print(f"remote {args.url}:", file=sys.stderr)
+        results = {"remote": asyncio.run(run_remote(args.url, args.requests, args.concurrency, args.warmup))}
+    else:
+        results = {"tracing_off": run_child(False, args), "tracing_on": run_child(True, args)}
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"results: {args.output}", file=sys.stderr)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"baseline saved: {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not args.baseline.exists():
+        # Без baseline сравнивать не с чем - это ошибка, а не молча пройденная проверка
+        print(f"no baseline at {args.baseline}, run with --save-baseline first", file=sys.stderr)
+        return 1
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Накладные расходы TraceIDMiddleware на запрос: старая версия на BaseHTTPMiddleware против чистого ASGI.
+
+    python -m benchmarks.middleware --requests 20000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Callable
+
+from fastapi import FastAPI, Request, Response
+from opentelemetry import trace
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.propagate import extract
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from otel_py_example.middleware import TraceIDMiddleware
+
+
+class LegacyTraceIDMiddleware(BaseHTTPMiddleware):
+    # Версия до перехода на чистый ASGI - оставлена только для сравнения
+    def __init__(self, app, trace_header_name: str = "X-Trace-ID"):
+        super().__init__(app)
+        self.trace_header_name = trace_header_name
+        self.tracer = trace.get_tracer(__name__)
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        frontend_trace_id = request.headers.get(self.trace_header_name)
+        parent_context = extract(dict(request.headers))
+        with self.tracer.start_as_current_span(
+            name=f"{request.method} {request.url.path}", context=parent_context, kind=SpanKind.SERVER
+        ) as span:
+            span.set_attribute("http.method", request.method)
+            span.set_attribute("http.url", str(request.url))
+            span.set_attribute("http.route", request.url.path)
+            if frontend_trace_id:
+                span.set_attribute("frontend.trace_id", frontend_trace_id)
+            request.state.frontend_trace_id = frontend_trace_id
+            request.state.otel_trace_id = trace.format_trace_id(span.get_span_context().trace_id)
+            response = await call_next(request)
+            span.set_status(Status(StatusCode.OK))
+            response.headers["X-Backend-Trace-ID"] = request.state.otel_trace_id
+            if frontend_trace_id:
+                response.headers["X-Frontend-Trace-ID"] = frontend_trace_id
+            return response
+
+
+def build_app(middleware: type | None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    def root():
+        return {"message": "Hello World"}
+
+    FastAPIInstrumentor.instrument_app(app)
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+
+async def call(app: FastAPI, scope: dict) -> None:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(dict(scope), receive, send)
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/",
+        "raw_path": b"/",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"x-trace-id", b"frontend-trace-id")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("localhost", 8000),
+    }
+    for _ in range(min(requests // 10, 1000)):
+        await call(app, scope)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app, scope)
+    return (time.perf_counter() - started) / requests * 1_000_000
+
+
+async def main(requests: int) -> None:
+    # Провайдер без экспортёра: меряем только стоимость спанов и middleware
+    trace.set_tracer_provider(TracerProvider())
+
+    results = {}
+    for name, middleware in [("none", None), ("legacy", LegacyTraceIDMiddleware), ("asgi", TraceIDMiddleware)]:
+        results[name] = await measure(build_app(middleware), requests)
+        print(f"{name:>8}: {results[name]:8.1f} us/request")
+
+    print(f"   saved: {results['legacy'] - results['asgi']:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
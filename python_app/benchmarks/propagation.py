@@ -0,0 +1,85 @@
+"""
+Стоимость получения trace_id и инжекта traceparent: старые хелперы (format_trace_id / propagate.inject
+на каждый вызов) против otel_py_example.propagation (один расчёт на спан).
+
+    python -m benchmarks.propagation --calls 200000
+"""
+
+import argparse
+import time
+from typing import Any, Callable, Dict
+
+from opentelemetry import trace
+from opentelemetry.propagate import inject
+from opentelemetry.sdk.trace import TracerProvider
+
+from otel_py_example.propagation import inject_trace_headers, span_ids
+
+
+def legacy_get_current_trace_id() -> str:
+    # Версия из middleware.py до перехода на propagation - оставлена только для сравнения
+    current_span = trace.get_current_span()
+    if current_span and current_span.get_span_context().trace_id:
+        return trace.format_trace_id(current_span.get_span_context().trace_id)
+    return "unknown"
+
+
+def legacy_inject() -> Dict[str, Any]:
+    headers: Dict[str, Any] = {}
+    inject(headers)
+    return headers
+
+
+def fast_get_current_trace_id() -> str:
+    return span_ids().trace_id
+
+
+def fast_inject() -> dict[str, str]:
+    return inject_trace_headers({})
+
+
+def measure(fn: Callable[[], Any], calls: int) -> float:
+    for _ in range(min(calls // 10, 10_000)):
+        fn()
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1_000_000_000
+
+
+def main(calls: int) -> None:
+    trace.set_tracer_provider(TracerProvider())
+    tracer = trace.get_tracer(__name__)
+
+    # Внутри одного спана: так вызывают хелперы роуты (несколько раз за запрос)
+    with tracer.start_as_current_span("benchmark"):
+        assert legacy_inject()["traceparent"] == fast_inject()["traceparent"]
+        assert legacy_get_current_trace_id() == fast_get_current_trace_id()
+
+        for name, legacy, fast in [
+            ("trace_id", legacy_get_current_trace_id, fast_get_current_trace_id),
+            ("inject", legacy_inject, fast_inject),
+        ]:
+            legacy_ns = measure(legacy, calls)
+            fast_ns = measure(fast, calls)
+            print(f"{name:>9}: legacy {legacy_ns:7.0f} ns  fast {fast_ns:7.0f} ns  x{legacy_ns / fast_ns:.1f}")
+
+    # Новый спан на каждый вызов - худший случай для кэша (первый расчёт)
+    def new_span_fast():
+        with tracer.start_as_current_span("benchmark"):
+            return inject_trace_headers({})
+
+    def new_span_legacy():
+        with tracer.start_as_current_span("benchmark"):
+            return legacy_inject()
+
+    legacy_ns = measure(new_span_legacy, calls // 10)
+    fast_ns = measure(new_span_fast, calls // 10)
+    print(f"{'new span':>9}: legacy {legacy_ns:7.0f} ns  fast {fast_ns:7.0f} ns  x{legacy_ns / fast_ns:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.calls)
@@ -0,0 +1,153 @@
+"""
+Одинаковая нагрузка на EntitiesRepository (SQLAlchemy) и EntitiesAsyncpgRepo (asyncpg) без кэша:
+латентность, аллокации (tracemalloc) и число спанов на операцию.
+Нужна база из настроек (POSTGRES_*); вставленные строки удаляются в конце.
+
+    python -m benchmarks.repositories --iterations 200
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from opentelemetry.instrumentation.asyncpg import AsyncPGInstrumentor
+from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from otel_py_example.repository.entities import EntitiesAsyncpgRepo, EntitiesRepo, EntitiesRepository
+from otel_py_example.resources.database import close_asyncpg_pool, create_asyncpg_pool, create_sa_engine
+from otel_py_example.settings import settings
+
+MARKER = "repository benchmark"
+WRITE_MARKER = "repository benchmark write"
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    index = min(int(round(q / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def drain_pages(repo: EntitiesRepo, limit: int) -> None:
+    after = 0
+    while page := await repo.get_entities_page(limit, after):
+        after = page[-1]["id"]
+
+
+def workloads(repo: EntitiesRepo, ids: list[int], page_size: int, bulk_size: int) -> dict[str, Callable[[], Awaitable]]:
+    bulk_rows = [(f"bulk-{i}", WRITE_MARKER) for i in range(bulk_size)]
+    return {
+        "get": lambda: repo.get_entity_by_id(str(random.choice(ids))),
+        "full_scan": repo.get_all_entities,
+        "paginated_scan": lambda: drain_pages(repo, page_size),
+        "insert": lambda: repo.create_entity("single", WRITE_MARKER),
+        "bulk_insert": lambda: repo.bulk_create(bulk_rows),
+    }
+
+
+async def measure(
+    operation: Callable[[], Awaitable], iterations: int, exporter: InMemorySpanExporter, alloc_iterations: int
+) -> dict:
+    for _ in range(max(iterations // 10, 1)):
+        await operation()
+
+    exporter.clear()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await operation()
+        latencies.append((time.perf_counter() - started) * 1000)
+    spans = len(exporter.get_finished_spans()) / iterations
+
+    # Отдельный проход: tracemalloc сам замедляет код и исказил бы латентность
+    tracemalloc.start()
+    peaks = []
+    for _ in range(alloc_iterations):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        await operation()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies),
+        "peak_alloc_kb": sorted(peaks)[len(peaks) // 2] / 1024,
+        "spans": spans,
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    # Провайдер с in-memory экспортом: считаем спаны, которые приложение отправило бы в коллектор
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+
+    engine = create_sa_engine(settings)
+    pool = await create_asyncpg_pool(settings)
+    SQLAlchemyInstrumentor().instrument(engine=engine.sync_engine, tracer_provider=provider)
+    AsyncPGInstrumentor().instrument(tracer_provider=provider)
+
+    repos: dict[str, EntitiesRepo] = {"sqlalchemy": EntitiesRepository(engine), "asyncpg": EntitiesAsyncpgRepo(pool)}
+    try:
+        async with pool.acquire() as conn:
+            existing = await conn.fetchval("SELECT count(*) FROM entities")
+            if existing < args.rows:
+                await conn.copy_records_to_table(
+                    "entities",
+                    records=[(f"seed-{i}", MARKER) for i in range(args.rows - existing)],
+                    columns=["name", "description"],
+                )
+            ids = [row["id"] for row in await conn.fetch("SELECT id FROM entities LIMIT $1", args.rows)]
+
+        backend_workloads = {
+            backend: workloads(repo, ids, args.page_size, args.bulk_size) for backend, repo in repos.items()
+        }
+        results: dict[str, dict] = {}
+        for name in backend_workloads["sqlalchemy"]:
+            iterations = args.iterations if name not in ("full_scan", "paginated_scan") else args.scan_iterations
+            # Операция на обоих бэкендах подряд, на одинаковом объёме таблицы
+            for backend, operations in backend_workloads.items():
+                stats = await measure(operations[name], iterations, exporter, args.alloc_iterations)
+                results.setdefault(name, {})[backend] = stats
+                print(
+                    f"{name:>15} {backend:>10}: p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f} ms  "
+                    f"alloc {stats['peak_alloc_kb']:8.1f} KB  spans {stats['spans']:5.1f}",
+                    file=sys.stderr,
+                )
+                async with pool.acquire() as conn:
+                    await conn.execute("DELETE FROM entities WHERE description = $1", WRITE_MARKER)
+        return results
+    finally:
+        async with pool.acquire() as conn:
+            await conn.execute("DELETE FROM entities WHERE description = ANY($1::text[])", [MARKER, WRITE_MARKER])
+        await close_asyncpg_pool(pool, settings.asyncpg_pool_close_timeout)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--scan-iterations", type=int, default=20)
+    parser.add_argument("--alloc-iterations", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=5000, help="Минимум строк в таблице для сканов")
+    parser.add_argument("--page-size", type=int, default=settings.entities_page_size)
+    parser.add_argument("--bulk-size", type=int, default=settings.entities_bulk_batch_size)
+    parser.add_argument("--output", type=Path, default=Path(__file__).parent / "results" / "repositories.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"results: {args.output}", file=sys.stderr)
@@ -0,0 +1,190 @@
+"""
+Сериализация большого списка сущностей: прежний путь (ORM объект / dict -> jsonable_encoder -> JSONResponse)
+против EntityRow + FastJSONResponse для каждой установленной библиотеки (orjson, msgspec, json).
+Время и пик аллокаций (tracemalloc) от строк asyncpg до готового тела ответа, плюс сквозной
+GET /entities-asyncpg/?limit=N через приложение. Нужны Postgres и Redis из настроек;
+вставленные строки удаляются в конце.
+
+    python -m benchmarks.serialization --rows 100000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import asyncpg
+
+MARKER = "serialization benchmark"
+RESULTS_DIR = Path(__file__).parent / "results"
+LIBRARIES = ("orjson", "msgspec", "json")
+
+
+def variants(records: list) -> dict[str, Callable[[], bytes]]:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from otel_py_example.models import tables
+    from otel_py_example.models.rows import EntityRow
+    from otel_py_example.responses import load_encoder
+
+    def legacy_dict() -> bytes:
+        # Как было: dict на строку, FastAPI прогоняет ответ через jsonable_encoder
+        entities = [{"name": row["name"], "description": row["description"], "id": row["id"]} for row in records]
+        return JSONResponse(jsonable_encoder({"entities": entities, "next_after": None})).body
+
+    def legacy_orm() -> bytes:
+        entities = [tables.Entity(**row) for row in records]
+        data = [{"name": entity.name, "description": entity.description, "id": entity.id} for entity in entities]
+        return JSONResponse(jsonable_encoder({"entities": data, "next_after": None})).body
+
+    result = {"legacy_dict": legacy_dict, "legacy_orm": legacy_orm}
+    for library in LIBRARIES:
+        try:
+            _, dumps = load_encoder(library)
+        except ImportError:
+            print(f"{library} not installed, skipped", file=sys.stderr)
+            continue
+
+        def fast(dumps=dumps) -> bytes:
+            entities = [EntityRow.from_row(row) for row in records]
+            return dumps({"entities": entities, "next_after": None})
+
+        result[f"rows_{library}"] = fast
+    return result
+
+
+def measure(operation: Callable[[], bytes], runs: int) -> dict:
+    operation()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        body = operation()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Отдельный проход: tracemalloc сам замедляет код и исказил бы время
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "peak_alloc_mb": (peak - before) / 2**20,
+        "body_mb": len(body) / 2**20,
+    }
+
+
+async def with_connection(operation: Callable[[asyncpg.Connection], Awaitable]):
+    from otel_py_example.resources.database import close_asyncpg_pool, create_asyncpg_pool
+    from otel_py_example.settings import settings
+
+    pool = await create_asyncpg_pool(settings)
+    try:
+        async with pool.acquire() as conn:
+            return await operation(conn)
+    finally:
+        await close_asyncpg_pool(pool, settings.asyncpg_pool_close_timeout)
+
+
+async def seed(conn: asyncpg.Connection, rows: int) -> list:
+    await conn.execute("DELETE FROM entities WHERE description = $1", MARKER)
+    await conn.copy_records_to_table(
+        "entities", records=((f"entity-{i}", MARKER) for i in range(rows)), columns=("name", "description")
+    )
+    return await conn.fetch("SELECT id, name, description FROM entities WHERE description = $1 ORDER BY id", MARKER)
+
+
+async def cleanup(conn: asyncpg.Connection) -> None:
+    await conn.execute("DELETE FROM entities WHERE description = $1", MARKER)
+
+
+async def measure_endpoint(rows: int, after: int, runs: int) -> dict:
+    import httpx
+
+    from otel_py_example.app import create_app
+
+    app = create_app()
+    params = {"limit": rows, "after": after}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+
+            async def request() -> httpx.Response:
+                response = await client.get("/entities-asyncpg/", params=params)
+                response.raise_for_status()
+                return response
+
+            # Разбор JSON только при проверке: в замерах не должно быть аллокаций клиента
+            assert len((await request()).json()["entities"]) == rows
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                await request()
+                timings.append((time.perf_counter() - started) * 1000)
+
+            tracemalloc.start()
+            before, _ = tracemalloc.get_traced_memory()
+            await request()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    return {"median_ms": statistics.median(timings), "min_ms": min(timings), "peak_alloc_mb": (peak - before) / 2**20}
+
+
+def format_row(name: str, stats: dict) -> str:
+    body = f"  body {stats['body_mb']:6.1f} MB" if "body_mb" in stats else ""
+    return (
+        f"  {name:>16}: median {stats['median_ms']:8.1f} ms  min {stats['min_ms']:8.1f} ms  "
+        f"peak alloc {stats['peak_alloc_mb']:7.1f} MB{body}"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-endpoint", action="store_true", help="Без сквозного запроса через приложение")
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "serialization.json")
+    args = parser.parse_args()
+
+    # Лимит страницы читается из настроек при импорте роутов
+    os.environ["ENTITIES_MAX_PAGE_SIZE"] = str(max(args.rows, 1000))
+
+    records = asyncio.run(with_connection(lambda conn: seed(conn, args.rows)))
+    # Сквозной запрос читает ровно вставленные строки: COPY одной пачкой даёт подряд идущие id
+    after = records[0]["id"] - 1
+    results: dict = {"rows": args.rows, "serialization": {}}
+    try:
+        print(f"{args.rows} rows -> response body:", file=sys.stderr)
+        for name, operation in variants(records).items():
+            results["serialization"][name] = measure(operation, args.runs)
+            print(format_row(name, results["serialization"][name]), file=sys.stderr)
+        del records
+
+        if not args.skip_endpoint:
+            from otel_py_example.responses import ENCODER_NAME
+
+            results["endpoint"] = asyncio.run(measure_endpoint(args.rows, after, args.runs))
+            results["endpoint"]["json_library"] = ENCODER_NAME
+            print(f"GET /entities-asyncpg/?limit={args.rows} ({ENCODER_NAME}):", file=sys.stderr)
+            print(format_row("endpoint", results["endpoint"]), file=sys.stderr)
+    finally:
+        asyncio.run(with_connection(cleanup))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"results: {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
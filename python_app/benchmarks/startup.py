@@ -0,0 +1,161 @@
+"""
+Холодный старт воркера: время импорта по модулям (-X importtime) и время до первого ответа
+(запуск интерпретатора, импорт, create_app, lifespan, первый запрос). Нужны Postgres и Redis из настроек.
+
+    python -m benchmarks.startup --runs 3
+    python -m benchmarks.startup --save-baseline
+    python -m benchmarks.startup --budget-ms 2500  # по умолчанию 5000, 0 - только baseline
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+# С запасом над типичным холодным стартом (~2 с с трейсингом): ловит заметную регрессию без baseline
+DEFAULT_BUDGET_MS = 5000.0
+PHASES = ("import_ms", "create_app_ms", "lifespan_ms", "first_request_ms", "to_first_response_ms")
+
+
+async def first_request(app) -> tuple[float, float, float]:
+    import httpx
+
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        lifespan_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://startup") as client:
+            response = await client.get("/")
+            response.raise_for_status()
+        # Момент ответа - до shutdown lifespan, для замера от запуска процесса
+        return lifespan_ms, (time.perf_counter() - started) * 1000, time.time()
+
+
+def run_child(output: Path) -> None:
+    started = time.perf_counter()
+    from otel_py_example.app import create_app
+
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    lifespan_ms, first_request_ms, responded_at = asyncio.run(first_request(app))
+    output.write_text(
+        json.dumps(
+            {
+                "import_ms": (imported - started) * 1000,
+                "create_app_ms": (created - imported) * 1000,
+                "lifespan_ms": lifespan_ms,
+                "first_request_ms": first_request_ms,
+                "responded_at": responded_at,
+            }
+        )
+    )
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    # "import time: self [us] | cumulative | imported package"
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure_once() -> tuple[dict, dict[str, tuple[int, int]]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "startup.json"
+        started = time.time()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "benchmarks.startup", "--child", "--output", str(output)],
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if result.returncode != 0:
+            sys.stderr.write(result.stderr[-4000:])
+            raise SystemExit(result.returncode)
+        phases = json.loads(output.read_text())
+    phases["to_first_response_ms"] = (phases.pop("responded_at") - started) * 1000
+    return phases, parse_importtime(result.stderr)
+
+
+def report_imports(modules: dict[str, tuple[int, int]], top: int) -> dict:
+    packages: dict[str, int] = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        packages[name.split(".")[0]] += self_us
+    own = {name: cumulative for name, (_, cumulative) in modules.items() if name.startswith("otel_py_example")}
+
+    print("import time by top-level package (self, ms):", file=sys.stderr)
+    for name, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {name:>40}: {self_us / 1000:8.1f}", file=sys.stderr)
+    print("otel_py_example modules (cumulative, ms):", file=sys.stderr)
+    for name, cumulative_us in sorted(own.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {name:>40}: {cumulative_us / 1000:8.1f}", file=sys.stderr)
+
+    return {
+        "packages_ms": {name: self_us / 1000 for name, self_us in packages.items()},
+        "modules_ms": {name: cumulative_us / 1000 for name, cumulative_us in own.items()},
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3, help="Берётся медиана по запускам")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Предел времени до первого ответа, 0 - без предела"
+    )
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "startup.json")
+    parser.add_argument("--baseline", type=Path, default=RESULTS_DIR / "startup-baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение фаз относительно baseline")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.output)
+        return 0
+
+    runs = [measure_once() for _ in range(args.runs)]
+    phases = {phase: statistics.median(run[0][phase] for run in runs) for phase in PHASES}
+    for phase in PHASES:
+        print(f"{phase:>22}: {phases[phase]:8.1f}", file=sys.stderr)
+    # Разбивка импорта - по последнему запуску (кэш байткода и ОС уже прогреты)
+    results = {"phases_ms": phases, "imports": report_imports(runs[-1][1], args.top)}
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"results: {args.output}", file=sys.stderr)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"baseline saved: {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not args.budget_ms and not args.baseline.exists():
+        print(f"no budget and no baseline at {args.baseline}, nothing to check against", file=sys.stderr)
+        return 1
+
+    failures = []
+    if args.budget_ms and phases["to_first_response_ms"] > args.budget_ms:
+        failures.append(f"to_first_response {phases['to_first_response_ms']:.1f} ms > budget {args.budget_ms:.1f} ms")
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())["phases_ms"]
+        for phase in PHASES:
+            if phase in baseline and phases[phase] > baseline[phase] * (1 + args.tolerance):
+                failures.append(f"{phase}: {baseline[phase]:.1f} -> {phases[phase]:.1f} ms")
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Admission control: адаптивный лимит одновременных запросов на роут.
+
+Лимит меняется по AIMD: пока латентность роута близка к базовой (без нагрузки), лимит растёт на 1 за "окно"
+(limit завершённых запросов), когда короткая средняя уходит выше базовой в tolerance раз
+(очередь в пуле БД, тормозит upstream) - умножается на backoff. Запрос сверх лимита сразу получает
+503 с Retry-After, не занимая соединение пула и не создавая корутин хендлера.
+Решение пишется в серверный спан и в метрику http.server.admission
+"""
+
+import json
+import math
+import time
+from functools import lru_cache
+
+from opentelemetry import metrics, trace
+from starlette.routing import BaseRoute, Match, Router
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from otel_py_example.settings import Settings
+
+meter = metrics.get_meter(__name__)
+
+admission_counter = meter.create_counter("http.server.admission", description="Admission decisions by route")
+
+SHED_BODY = json.dumps({"detail": "Service overloaded, retry later"}).encode()
+
+
+@lru_cache(maxsize=256)
+def admission_attributes(route: str, decision: str) -> dict:
+    return {"http.route": route, "admission.decision": decision}
+
+
+class AdaptiveLimiter:
+    """
+    Лимит одного роута. Работает в одном event loop, поэтому без локов
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        tolerance: float,
+        backoff: float,
+        short_window: int = 10,
+        long_window: int = 500,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.short_alpha = 1 / short_window
+        self.long_alpha = 1 / long_window
+        self.warmup = short_window
+
+        self.in_flight = 0
+        self.short_ms = 0.0
+        self.baseline_ms = 0.0
+        self.samples = 0
+        # Уменьшение не чаще раза за "окно": запросы, стартовавшие до прошлого уменьшения, его не повторяют
+        self._until_next_decrease = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency_ms: float) -> None:
+        utilized = self.in_flight >= self.limit / 2
+        self.in_flight -= 1
+        self.samples += 1
+        if self.samples == 1:
+            self.short_ms = self.baseline_ms = latency_ms
+            return
+        self.short_ms += (latency_ms - self.short_ms) * self.short_alpha
+        # Базовая латентность - по запросам без нагрузки (лимит занят меньше чем наполовину);
+        # под нагрузкой она может только снижаться (по сглаженной, не по отдельным быстрым запросам),
+        # иначе медленный рост очереди станет новой нормой
+        alpha = max(self.long_alpha, 1 / self.samples)
+        if not utilized:
+            self.baseline_ms += (latency_ms - self.baseline_ms) * alpha
+        elif self.short_ms < self.baseline_ms:
+            self.baseline_ms += (self.short_ms - self.baseline_ms) * alpha
+        if self._until_next_decrease > 0:
+            self._until_next_decrease -= 1
+
+        if self.samples > self.warmup and self.short_ms > self.baseline_ms * self.tolerance:
+            if self._until_next_decrease == 0:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._until_next_decrease = self.in_flight + 1
+        elif utilized:
+            # Растём, только когда лимит действительно используется
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.short_ms / 1000))
+
+
+class AdmissionControlMiddleware:
+    """
+    Лимиты по шаблону роута: роут находится заранее тем же matches(), что использует Router.
+    Должна стоять внутри middleware FastAPIInstrumentor (решение пишется в серверный спан)
+    и внутри REDMetricsMiddleware (отказы видны в RED метриках роута как 503)
+    """
+
+    def __init__(self, app: ASGIApp, router: Router, settings: Settings):
+        self.app = app
+        self.router = router
+        self.settings = settings
+        self.limiters: dict[str, AdaptiveLimiter] = {}
+        self._match = lru_cache(maxsize=4096)(self._match_route)
+
+        def observe_limits(options):
+            return [
+                metrics.Observation(int(limiter.limit), {"http.route": route})
+                for route, limiter in self.limiters.items()
+            ]
+
+        meter.create_observable_gauge(
+            "http.server.admission.limit", callbacks=[observe_limits], description="Current concurrency limit by route"
+        )
+
+    def _match_route(self, method: str, path: str, root_path: str) -> BaseRoute | None:
+        scope = {"type": "http", "method": method, "path": path, "root_path": root_path}
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    def _limiter(self, route: str) -> AdaptiveLimiter:
+        limiter = self.limiters.get(route)
+        if limiter is None:
+            settings = self.settings
+            limiter = self.limiters[route] = AdaptiveLimiter(
+                initial=settings.admission_initial_limit,
+                min_limit=settings.admission_min_limit,
+                max_limit=settings.admission_route_limits.get(route, settings.admission_max_limit),
+                tolerance=settings.admission_latency_tolerance,
+                backoff=settings.admission_backoff_ratio,
+            )
+        return limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self._match(scope["method"], scope["path"], scope.get("root_path", ""))
+        # 404/405 и роуты без path (Mount и т.п.) не ограничиваем
+        route_path = getattr(route, "path", None)
+        if route_path is None or route_path in self.settings.admission_excluded_routes:
+            await self.app(scope, receive, send)
+            return
+
+        # Router выставит тот же роут; нужен раньше - для RED метрик отклонённых запросов
+        scope["route"] = route
+        limiter = self._limiter(route_path)
+        admitted = limiter.try_acquire()
+
+        span = trace.get_current_span()
+        if span.is_recording():
+            span.set_attributes(
+                {
+                    "admission.decision": "admitted" if admitted else "shed",
+                    "admission.limit": int(limiter.limit),
+                    "admission.in_flight": limiter.in_flight,
+                }
+            )
+        admission_counter.add(1, admission_attributes(route_path, "admitted" if admitted else "shed"))
+
+        if not admitted:
+            await self._shed(send, limiter.retry_after)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release((time.perf_counter() - started) * 1000)
+
+    async def _shed(self, send: Send, retry_after: int) -> None:
+        start: Message = {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(SHED_BODY)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        }
+        await send(start)
+        await send({"type": "http.response.body", "body": SHED_BODY})
@@ -0,0 +1,114 @@
+"""
+Фабрика приложения.
+
+Импорт модуля ничего не создаёт: логирование, middleware и роуты собираются в create_app(),
+OTel SDK, экспортёры, инструментаторы и пулы соединений - в lifespan уже внутри воркера
+"""
+
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from otel_py_example.settings import settings
+
+APP_NAME: str = os.environ.get("APP_NAME", "app")
+OTLP_ENDPOINT: str = os.environ.get("OTLP_ENDPOINT", "http://otel-collector:4317")
+# http://localhost:4317 for local running
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from loguru import logger
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+
+    from otel_py_example.container import Container
+    from otel_py_example.logs import setting_logs, shutdown_logs
+    from otel_py_example.metrics import register_pool_gauges
+    from otel_py_example.utils import setting_metrics, setting_otlp
+
+    # TracerProvider, движки БД и пулы создаются здесь, а не при импорте:
+    # каждый воркер поднимает свои после fork/spawn
+    tracer = setting_otlp(APP_NAME, OTLP_ENDPOINT)
+    meter_provider = setting_metrics(APP_NAME, OTLP_ENDPOINT)
+    log_provider = setting_logs(APP_NAME, OTLP_ENDPOINT, settings)
+
+    # Пулы, репозитории и хендлеры создаются один раз на всё время жизни приложения
+    container = Container(settings, APP_NAME, OTLP_ENDPOINT)
+    await container.startup()
+    app.state.container = container
+    register_pool_gauges(container)
+
+    # Запросы идут через async движок - инструментируем его sync_engine (там живут события SQLAlchemy)
+    if container.database_engine is not None:
+        SQLAlchemyInstrumentor().instrument(
+            engine=container.database_engine.sync_engine,
+            tracer_provider=tracer,
+            enable_commenter=settings.database_sql_commenter,
+            commenter_options={},
+        )
+    # Instrument redis
+    RedisInstrumentor().instrument(tracer_provider=tracer)
+    try:
+        yield
+    finally:
+        await container.shutdown()
+        # Дописываем накопленные спаны и метрики перед выходом воркера
+        shutdown_logs(log_provider)
+        meter_provider.shutdown()
+        tracer.shutdown()
+        # Дописываем очередь stderr sink'а
+        await logger.complete()
+
+
+def create_app() -> FastAPI:
+    from fastapi.middleware.cors import CORSMiddleware
+
+    from otel_py_example.admission import AdmissionControlMiddleware
+    from otel_py_example.logs import configure_logging
+    from otel_py_example.metrics import REDMetricsMiddleware
+    from otel_py_example.middleware import TraceIDMiddleware
+    from otel_py_example.resilience import (
+        CircuitOpenError,
+        DeadlineExceeded,
+        DeadlineMiddleware,
+        circuit_open_handler,
+        deadline_exceeded_handler,
+    )
+    from otel_py_example.routes import router
+    from otel_py_example.utils import instrument_app
+
+    configure_logging(settings)
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(router)
+    # Разомкнутый breaker зависимости - 503 с Retry-After, истёкший дедлайн запроса - 504
+    app.add_exception_handler(CircuitOpenError, circuit_open_handler)
+    app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
+
+    # Setting OpenTelemetry instrumentation (провайдер и экспортёр создаются в lifespan)
+    instrument_app(app)
+
+    # Дедлайн запроса для вызовов Postgres, Redis и HTTP-зависимостей
+    app.add_middleware(DeadlineMiddleware, default_timeout=settings.request_timeout)
+
+    # Лимит одновременных запросов по роутам (внутри RED метрик - отказы учитываются как 503)
+    if settings.admission_enabled:
+        app.add_middleware(AdmissionControlMiddleware, router=app.router, settings=settings)
+
+    # RED метрики по роутам (внутри серверного спана FastAPIInstrumentor - для exemplar'ов)
+    app.add_middleware(REDMetricsMiddleware)
+
+    # Add TraceID middleware for handling frontend trace_id (должен быть перед CORS)
+    app.add_middleware(TraceIDMiddleware)
+
+    # Add CORS middleware (должен быть последним)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Allows all origins
+        allow_credentials=True,
+        allow_methods=["*"],  # Allows all methods
+        allow_headers=["*"],  # Allows all headers
+    )
+    return app
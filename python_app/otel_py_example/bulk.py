@@ -0,0 +1,130 @@
+"""
+Массовая загрузка сущностей: разбор JSON-массива / NDJSON потока и вставка пачками
+"""
+
+import json
+from typing import AsyncIterator, Awaitable, Callable
+
+import asyncpg
+import pydantic
+from fastapi import Request
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+from sqlalchemy import exc as sa_exc
+
+from otel_py_example.resources.database import DATABASE_FAILURES
+from otel_py_example.schemas import EntityCreateModel
+
+tracer = trace.get_tracer(__name__)
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
+# Ошибки данных пачки (constraint, недопустимое значение, кодировка) попадают в отчёт. SQLAlchemy
+# заворачивает их в DBAPIError, как и отказы базы - те (и открытый breaker, дедлайн) прерывают загрузку
+BATCH_DATA_ERRORS = (
+    sa_exc.DBAPIError,
+    asyncpg.IntegrityConstraintViolationError,
+    asyncpg.DataError,
+    UnicodeEncodeError,
+    TypeError,
+)
+
+
+async def read_entity_items(request: Request) -> AsyncIterator[tuple[int, EntityCreateModel | str]]:
+    """
+    Отдаёт (индекс, модель) для валидных элементов и (индекс, текст ошибки) для невалидных
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(NDJSON_CONTENT_TYPES):
+        async for index, item in _iter_ndjson(request):
+            yield index, item
+        return
+
+    try:
+        payload = await request.json()
+    except ValueError as e:
+        yield 0, f"invalid JSON: {e}"
+        return
+    if not isinstance(payload, list):
+        yield 0, "expected a JSON array"
+        return
+    for index, item in enumerate(payload):
+        yield index, _validate(item)
+
+
+async def _iter_ndjson(request: Request) -> AsyncIterator[tuple[int, EntityCreateModel | str]]:
+    # Тело читается потоком: пачки уходят в базу, не дожидаясь конца запроса
+    index = 0
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, _parse_line(line)
+                index += 1
+    if buffer.strip():
+        yield index, _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> EntityCreateModel | str:
+    try:
+        return _validate(json.loads(line))
+    except ValueError as e:
+        return f"invalid JSON: {e}"
+
+
+def _validate(item) -> EntityCreateModel | str:
+    try:
+        return EntityCreateModel.model_validate(item)
+    except pydantic.ValidationError as e:
+        return "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+
+
+async def ingest(
+    items: AsyncIterator[tuple[int, EntityCreateModel | str]],
+    insert_batch: Callable[[list[tuple[str, str]]], Awaitable[int]],
+    batch_size: int,
+) -> dict:
+    """
+    Вставляет валидные элементы пачками по batch_size, ошибки элементов и пачек собирает в отчёт
+    """
+    report = {"inserted": 0, "batches": 0, "errors": []}
+    batch: list[tuple[str, str]] = []
+    batch_indexes: list[int] = []
+
+    async def flush():
+        batch_number = report["batches"]
+        report["batches"] += 1
+        with tracer.start_as_current_span("bulk insert batch") as span:
+            span.set_attribute("bulk.batch", batch_number)
+            span.set_attribute("bulk.batch_size", len(batch))
+            try:
+                report["inserted"] += await insert_batch(batch)
+            except BATCH_DATA_ERRORS as e:
+                if isinstance(e, DATABASE_FAILURES):
+                    raise
+                span.record_exception(e)
+                span.set_status(Status(StatusCode.ERROR, str(e)))
+                report["errors"].append(
+                    {
+                        "batch": batch_number,
+                        "first_index": batch_indexes[0],
+                        "last_index": batch_indexes[-1],
+                        "error": str(e),
+                    }
+                )
+
+    async for index, item in items:
+        if isinstance(item, str):
+            report["errors"].append({"index": index, "error": item})
+            continue
+        batch.append((item.name, item.description))
+        batch_indexes.append(index)
+        if len(batch) >= batch_size:
+            await flush()
+            batch, batch_indexes = [], []
+    if batch:
+        await flush()
+
+    return report
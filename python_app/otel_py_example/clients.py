@@ -1,25 +1,259 @@
+import asyncio
+import random
+
 import httpx
-from otel_py_example.settings import settings
+from loguru import logger
+from opentelemetry import context as otel_context
+from opentelemetry import metrics, trace
+from opentelemetry.context import Context
+
+from otel_py_example.resilience import Policy, deadline_headers, detached_context, wait_shared
+
+meter = metrics.get_meter(__name__)
+tracer = trace.get_tracer(__name__)
+
+requests_counter = meter.create_counter("http.client.requests", description="Outgoing requests by target")
+connections_counter = meter.create_counter(
+    "http.client.connections.opened", description="New TCP connections opened (requests minus this = reused)"
+)
+retries_counter = meter.create_counter("http.client.retries", description="Retried outgoing requests by target")
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUS_CODES = frozenset({502, 503, 504})
+# Ошибки, при которых запрос точно не ушёл на сервер - их можно повторять для любого метода
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class ServiceClient:
+    """
+    Клиент одного целевого сервиса поверх общего httpx.AsyncClient: свои таймауты и ретраи с jitter.
+    С policy: circuit breaker на сервис (сбой - ошибка транспорта или 5xx), ретраи в пределах бюджета
+    и дедлайна запроса, остаток дедлайна уходит в заголовке X-Request-Timeout-Ms
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        name: str,
+        base_url: str,
+        timeout: httpx.Timeout,
+        retries: int = 0,
+        backoff_base: float = 0.05,
+        backoff_max: float = 1.0,
+        policy: Policy | None = None,
+    ):
+        self.client = client
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.policy = policy
+        self._attributes = {"target": name}
+        self._extensions = {"trace": self._trace}
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            requests_counter.add(1, self._attributes)
+            try:
+                response = await self._send(method, path, kwargs)
+            except httpx.TransportError as e:
+                if not self._can_retry(method, e) or not await self._backoff(attempt, e):
+                    raise
+            else:
+                if not self._can_retry(method, response) or not await self._backoff(attempt, response):
+                    return response
+                await response.aclose()
+            attempt += 1
+
+    async def _send(self, method: str, path: str, kwargs: dict) -> httpx.Response:
+        url = self.base_url + path
+        if self.policy is None:
+            return await self.client.request(method, url, timeout=self.timeout, extensions=self._extensions, **kwargs)
+
+        timeout = self.policy.timeout()
+        self.policy.breaker.before_call()
+        headers = deadline_headers(kwargs.get("headers"))
+        try:
+            async with asyncio.timeout(timeout) as deadline:
+                response = await self.client.request(
+                    method, url, timeout=self.timeout, extensions=self._extensions, **{**kwargs, "headers": headers}
+                )
+        except (httpx.TransportError, TimeoutError) as e:
+            if deadline.expired():
+                raise self.policy.deadline_expired() from e
+            self.policy.on_failure()
+            raise
+        except BaseException:
+            self.policy.breaker.release()
+            raise
+        if response.status_code >= 500:
+            self.policy.on_failure()
+        else:
+            self.policy.on_success()
+        return response
+
+    async def _backoff(self, attempt: int, outcome: httpx.Response | Exception) -> bool:
+        if self.policy is not None:
+            error = type(outcome).__name__ if isinstance(outcome, Exception) else str(outcome.status_code)
+            pause = self.policy.next_pause(attempt, self.retries, error)
+            if pause is None:
+                return False
+        else:
+            if attempt >= self.retries:
+                return False
+            # Full jitter: случайная пауза от 0 до экспоненциального предела
+            pause = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt + 1)))
+        retries_counter.add(1, self._attributes)
+        await asyncio.sleep(pause)
+        return True
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    @staticmethod
+    def _can_retry(method: str, outcome: httpx.Response | Exception) -> bool:
+        if isinstance(outcome, NOT_SENT_ERRORS):
+            return True
+        if method not in IDEMPOTENT_METHODS:
+            return False
+        if isinstance(outcome, httpx.Response):
+            return outcome.status_code in RETRY_STATUS_CODES
+        return isinstance(outcome, httpx.TransportError)
 
+    async def _trace(self, event_name: str, info: dict) -> None:
+        # httpcore зовёт этот хук только когда в пуле нет свободного keep-alive соединения
+        if event_name == "connection.connect_tcp.complete":
+            connections_counter.add(1, self._attributes)
 
-async def fetch_data_service_2(entity_id: int):
-    async with httpx.AsyncClient() as client:
-        result = await client.get(f"http://{settings.second_app_host}:8001/entity/", params={"entity_id": entity_id})
-        print(f"Result is {result}, {result.text}")
+
+async def fetch_data_service_2(client: ServiceClient, entity_id: int):
+    result = await client.get("/entity/", params={"entity_id": entity_id})
+    logger.debug("Result is {}, {}", result, result.text)
     return result.json()
 
 
-async def update_data_service_2(entity_id: str, value: str):
-    async with httpx.AsyncClient() as client:
-        result = await client.post(
-            f"http://{settings.second_app_host}:8001/entity/", json={"entity_id": entity_id, "value": value}
-        )
-        print(f"Result is {result}, {result.text}")
+async def update_data_service_2(client: ServiceClient, entity_id: str, value: str):
+    result = await client.post("/entity/", json={"entity_id": entity_id, "value": value})
+    logger.debug("Result is {}, {}", result, result.text)
     return result.json()
 
 
-async def call_error():
-    async with httpx.AsyncClient() as client:
-        result = await client.post(f"http://{settings.second_app_host}:8001/entity/bad-blood/")
-        print(f"Result is {result}, {result.text}")
+async def call_error(client: ServiceClient):
+    result = await client.post("/entity/bad-blood/")
+    logger.debug("Result is {}, {}", result, result.text)
     return result.json()
+
+
+class FetchCoalescer:
+    """
+    Склеивает одинаковые одновременные запросы в app2 в один и собирает разные id,
+    пришедшие в пределах окна, в одну пачку
+    """
+
+    def __init__(
+        self,
+        client: ServiceClient,
+        window: float = 0.002,
+        max_batch_size: int = 50,
+        batch_path: str | None = None,
+    ):
+        self.client = client
+        self.window = window
+        self.max_batch_size = max_batch_size
+        # Путь batch-API в app2 (GET с повторяющимся entity_id, ответ {"<id>": ...}).
+        # Если не задан, пачка уходит параллельными одиночными запросами под одним общим спаном
+        self.batch_path = batch_path
+
+        self._in_flight: dict[int, asyncio.Future] = {}
+        self._pending: dict[int, asyncio.Future] = {}
+        self._pending_links: list[trace.Link] = []
+        self._pending_context: Context | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        # Ссылки на задачи пачек: event loop держит только слабые, незавершённую задачу может собрать GC
+        self._tasks: set[asyncio.Task] = set()
+
+    async def fetch(self, entity_id: int):
+        with tracer.start_as_current_span("second_app coalesced fetch") as span:
+            span.set_attribute("entity_id", entity_id)
+            future = self._in_flight.get(entity_id)
+            span.set_attribute("coalesce.joined", future is not None)
+            if future is None:
+                future = self._enqueue(entity_id, span)
+            result, upstream_context = await wait_shared(future, self.client.name)
+            span.add_link(upstream_context, {"coalesce.role": "caller"})
+            return result
+
+    def _enqueue(self, entity_id: int, span: trace.Span) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[entity_id] = future
+        self._pending[entity_id] = future
+        self._pending_links.append(trace.Link(span.get_span_context()))
+        if self._pending_context is None:
+            # Общий upstream-спан пишется в трейс первого запроса пачки, остальные ссылаются на него линками
+            self._pending_context = otel_context.get_current()
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, links, parent = self._pending, self._pending_links, self._pending_context
+        self._pending, self._pending_links, self._pending_context = {}, [], None
+        if batch:
+            # Пачка общая: без дедлайна запроса, запустившего её (в т.ч. через call_later)
+            task = asyncio.get_running_loop().create_task(
+                self._dispatch(batch, links, parent), context=detached_context()
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: dict[int, asyncio.Future], links: list[trace.Link], parent: Context) -> None:
+        results: dict = {}
+        upstream_context = None
+        try:
+            with tracer.start_as_current_span("second_app batch fetch", context=parent, links=links) as span:
+                span.set_attribute("coalesce.batch_size", len(batch))
+                upstream_context = span.get_span_context()
+                try:
+                    results = await self._fetch_batch(list(batch))
+                except Exception as e:
+                    span.record_exception(e)
+                    results = {entity_id: e for entity_id in batch}
+        finally:
+            # И при отмене задачи: иначе ожидающие fetch() и все следующие запросы тех же id
+            # висели бы на future, который никто не завершит
+            for entity_id, future in batch.items():
+                if self._in_flight.get(entity_id) is future:
+                    del self._in_flight[entity_id]
+                if future.done():
+                    continue
+                if entity_id not in results:
+                    future.set_exception(RuntimeError("Coalesced second_app fetch was cancelled"))
+                    continue
+                result = results[entity_id]
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result((result, upstream_context))
+
+    async def _fetch_batch(self, entity_ids: list[int]) -> dict:
+        if self.batch_path is not None:
+            response = await self.client.get(self.batch_path, params={"entity_id": entity_ids})
+            data = response.json()
+            return {entity_id: data.get(str(entity_id)) for entity_id in entity_ids}
+
+        results = await asyncio.gather(
+            *(fetch_data_service_2(self.client, entity_id) for entity_id in entity_ids), return_exceptions=True
+        )
+        return dict(zip(entity_ids, results))
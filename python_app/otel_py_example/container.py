@@ -0,0 +1,208 @@
+"""
+Контейнер зависимостей: собирает пулы, репозитории и хендлеры один раз на старте приложения
+"""
+
+import asyncio
+
+import asyncpg
+import httpx
+from fastapi import Request
+from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from otel_py_example.clients import FetchCoalescer, ServiceClient
+from otel_py_example.executors import Executors
+from otel_py_example.handlers import EntitiesHandler, EntitiesHandlerAsyncpg
+from otel_py_example.repository.cache import CachedEntitiesRepo
+from otel_py_example.repository.entities import EntitiesAsyncpgRepo, EntitiesRepo, EntitiesRepository
+from otel_py_example.repository.local_cache import CacheInvalidationBus, LocalCache
+from otel_py_example.repository.redis_repo import RedisRepo
+from otel_py_example.resilience import build_policy
+from otel_py_example.resources.database import (
+    DATABASE_FAILURES,
+    close_asyncpg_pool,
+    create_asyncpg_pool,
+    create_sa_engine,
+)
+from otel_py_example.resources.http import create_http_client
+from otel_py_example.resources.redis import REDIS_FAILURES, create_redis_client
+from otel_py_example.settings import Settings
+
+
+class Container:
+    def __init__(
+        self,
+        settings: Settings,
+        app_name: str | None = None,
+        otlp_endpoint: str | None = None,
+    ):
+        self.settings = settings
+        self.database_engine: AsyncEngine | None = None
+        self.app_name = app_name
+        self.otlp_endpoint = otlp_endpoint
+
+        self.asyncpg_pool: asyncpg.Pool | None = None
+        self.redis_client: aioredis.Redis | None = None
+        self.cache_redis_client: aioredis.Redis | None = None
+        self.invalidation_bus: CacheInvalidationBus | None = None
+        self.entities_local_cache: LocalCache | None = None
+        self.redis_local_cache: LocalCache | None = None
+
+        self.entities_handler: EntitiesHandler | None = None
+        self.entities_handler_asyncpg: EntitiesHandlerAsyncpg | None = None
+        self.redis_repo: RedisRepo | None = None
+
+        self.http_client: httpx.AsyncClient | None = None
+        self.second_app_client: ServiceClient | None = None
+        self.second_app_coalescer: FetchCoalescer | None = None
+        self.chain_client: ServiceClient | None = None
+
+        self.executors: Executors | None = None
+
+        # Один breaker на зависимость: оба репозитория ходят в одну базу
+        self.database_policy = build_policy("postgres", settings, DATABASE_FAILURES, settings.database_max_reties_count)
+        self.redis_policy = build_policy("redis", settings, REDIS_FAILURES, settings.redis_max_retries)
+
+    async def startup(self) -> None:
+        # SQLAlchemy движок нужен только репозиторию за /entities/ с бэкендом sqlalchemy
+        if self.settings.entities_backend == "sqlalchemy":
+            self.database_engine = create_sa_engine(self.settings)
+        self.asyncpg_pool = await create_asyncpg_pool(self.settings)
+        self.redis_client = create_redis_client(self.settings)
+
+        if self.settings.local_cache_enabled:
+            self.invalidation_bus = CacheInvalidationBus(self.redis_client, self.settings.cache_invalidation_channel)
+            self.entities_local_cache = self.invalidation_bus.register(self.local_cache("entities"))
+            self.redis_local_cache = self.invalidation_bus.register(self.local_cache("redis"))
+            await self.invalidation_bus.start()
+
+        entities_repo = self.entities_repo(self.settings.entities_backend)
+        entities_asyncpg_repo = self.entities_repo("asyncpg")
+        if self.settings.entities_cache_enabled:
+            # Кэш хранит байты, поэтому у него свой клиент без decode_responses
+            self.cache_redis_client = create_redis_client(self.settings, decode_responses=False)
+            entities_repo = self.cached(entities_repo)
+            entities_asyncpg_repo = self.cached(entities_asyncpg_repo)
+
+        self.entities_handler = EntitiesHandler(entities_repo)
+        self.entities_handler_asyncpg = EntitiesHandlerAsyncpg(entities_asyncpg_repo)
+        self.redis_repo = RedisRepo(
+            self.redis_client, self.redis_local_cache, self.invalidation_bus, policy=self.redis_policy
+        )
+
+        self.http_client = create_http_client(self.settings)
+        self.second_app_client = self.service_client(
+            "second_app",
+            f"http://{self.settings.second_app_host}:{self.settings.second_app_port}",
+            httpx.Timeout(self.settings.second_app_timeout, connect=self.settings.second_app_connect_timeout),
+            self.settings.second_app_retries,
+        )
+        self.second_app_coalescer = FetchCoalescer(
+            self.second_app_client,
+            window=self.settings.second_app_coalesce_window_ms / 1000,
+            max_batch_size=self.settings.second_app_coalesce_max_batch_size,
+            batch_path=self.settings.second_app_batch_path,
+        )
+        self.chain_client = self.service_client(
+            "chain",
+            self.settings.chain_target_url,
+            httpx.Timeout(self.settings.chain_timeout),
+            self.settings.chain_retries,
+        )
+
+        self.executors = Executors(
+            thread_workers=self.settings.executor_thread_workers,
+            process_workers=self.settings.process_workers,
+            max_queue=self.settings.executor_max_queue,
+            cpu_mode=self.settings.executor_cpu_mode,
+            app_name=self.app_name,
+            otlp_endpoint=self.otlp_endpoint,
+        )
+
+    def entities_repo(self, backend: str) -> EntitiesRepo:
+        if backend == "sqlalchemy":
+            return EntitiesRepository(self.database_engine, self.database_policy)
+        if backend == "asyncpg":
+            return EntitiesAsyncpgRepo(self.asyncpg_pool, self.database_policy)
+        raise ValueError(f"Unknown entities backend: {backend}")
+
+    def service_client(self, name: str, base_url: str, timeout: httpx.Timeout, retries: int) -> ServiceClient:
+        return ServiceClient(
+            self.http_client,
+            name,
+            base_url,
+            timeout,
+            retries=retries,
+            backoff_base=self.settings.http_backoff_base,
+            backoff_max=self.settings.http_backoff_max,
+            # Ретраи HTTP остаются у клиента (идемпотентность, коды 502-504), policy даёт breaker и бюджет
+            policy=build_policy(name, self.settings, ()),
+        )
+
+    def local_cache(self, name: str) -> LocalCache:
+        return LocalCache(
+            name,
+            max_items=self.settings.local_cache_max_items,
+            max_bytes=self.settings.local_cache_max_bytes,
+            ttl=self.settings.local_cache_ttl,
+        )
+
+    def cached(self, repository: EntitiesRepo) -> CachedEntitiesRepo:
+        return CachedEntitiesRepo(
+            repository,
+            self.cache_redis_client,
+            prefix=self.settings.entities_cache_prefix,
+            ttl=self.settings.entities_cache_ttl,
+            negative_ttl=self.settings.entities_cache_negative_ttl,
+            serializer=self.settings.entities_cache_serializer,
+            local_cache=self.entities_local_cache,
+            invalidation_bus=self.invalidation_bus,
+        )
+
+    async def shutdown(self) -> None:
+        if self.executors is not None:
+            await asyncio.to_thread(self.executors.shutdown)
+        if self.http_client is not None:
+            await self.http_client.aclose()
+        if self.invalidation_bus is not None:
+            await self.invalidation_bus.stop()
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+        if self.cache_redis_client is not None:
+            await self.cache_redis_client.aclose()
+        if self.asyncpg_pool is not None:
+            await close_asyncpg_pool(self.asyncpg_pool, self.settings.asyncpg_pool_close_timeout)
+        if self.database_engine is not None:
+            await self.database_engine.dispose()
+
+
+def get_container(request: Request) -> Container:
+    return request.app.state.container
+
+
+def get_entities_handler(request: Request) -> EntitiesHandler:
+    return get_container(request).entities_handler
+
+
+def get_entities_handler_asyncpg(request: Request) -> EntitiesHandlerAsyncpg:
+    return get_container(request).entities_handler_asyncpg
+
+
+def get_redis_repo(request: Request) -> RedisRepo:
+    return get_container(request).redis_repo
+
+
+def get_second_app_client(request: Request) -> ServiceClient:
+    return get_container(request).second_app_client
+
+
+def get_second_app_coalescer(request: Request) -> FetchCoalescer:
+    return get_container(request).second_app_coalescer
+
+
+def get_executors(request: Request) -> Executors:
+    return get_container(request).executors
+
+
+def get_chain_client(request: Request) -> ServiceClient:
+    return get_container(request).chain_client
@@ -0,0 +1,127 @@
+"""
+Вынос блокирующей работы в пул потоков и CPU-bound работы в пул процессов
+с переносом OpenTelemetry контекста через границу пула
+"""
+
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from opentelemetry import context as otel_context
+from opentelemetry import metrics, trace
+from opentelemetry.propagate import extract, inject
+
+meter = metrics.get_meter(__name__)
+tracer = trace.get_tracer(__name__)
+
+pending_counter = meter.create_up_down_counter(
+    "executor.tasks.pending", description="Tasks submitted and not finished yet (waiting for a slot + queued + running)"
+)
+wait_histogram = meter.create_histogram(
+    "executor.wait_time", unit="ms", description="Time from submit until a pool worker picks the task up"
+)
+run_histogram = meter.create_histogram("executor.run_time", unit="ms", description="Task run time inside the worker")
+
+
+def _run_in_thread(fn: Callable, args: tuple) -> tuple[float, Any]:
+    # contextvars уже скопированы через ctx.run, OTel контекст доступен как есть
+    return time.time(), fn(*args)
+
+
+def _run_in_process(carrier: dict, fn: Callable, args: tuple) -> tuple[float, Any]:
+    started_at = time.time()
+    token = otel_context.attach(extract(carrier))
+    try:
+        return started_at, fn(*args)
+    finally:
+        otel_context.detach(token)
+
+
+def _init_process(app_name: str | None, otlp_endpoint: str | None) -> None:
+    # В дочернем процессе свой TracerProvider, иначе его спаны никуда не уйдут
+    if app_name and otlp_endpoint:
+        from otel_py_example.utils import create_tracer_provider
+
+        create_tracer_provider(app_name, otlp_endpoint)
+
+
+class Executors:
+    def __init__(
+        self,
+        thread_workers: int = 8,
+        process_workers: int | None = None,
+        max_queue: int = 100,
+        cpu_mode: str = "process",
+        app_name: str | None = None,
+        otlp_endpoint: str | None = None,
+    ):
+        if cpu_mode not in ("process", "thread", "inline"):
+            raise ValueError(f"Unknown cpu executor mode: {cpu_mode}")
+        process_workers = process_workers or os.cpu_count() or 1
+        self.cpu_mode = cpu_mode
+        self.thread_pool = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="blocking")
+        self.process_pool: ProcessPoolExecutor | None = None
+        if cpu_mode == "process":
+            # spawn: fork процесса с event loop и потоками экспортёра небезопасен
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+                initargs=(app_name, otlp_endpoint),
+            )
+        # Ограничиваем очередь: при переполнении вызывающие ждут, а не копят задачи в памяти пула
+        self._thread_slots = asyncio.Semaphore(thread_workers + max_queue)
+        self._process_slots = asyncio.Semaphore(process_workers + max_queue)
+
+    async def run_blocking(self, fn: Callable, *args) -> Any:
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, _run_in_thread, fn, args)
+        return await self._submit("thread", self.thread_pool, self._thread_slots, call)
+
+    async def run_cpu(self, fn: Callable, *args) -> Any:
+        if self.cpu_mode == "inline":
+            return fn(*args)
+        if self.cpu_mode == "thread":
+            return await self.run_blocking(fn, *args)
+
+        carrier: dict[str, str] = {}
+        with tracer.start_as_current_span(f"executor process {fn.__name__}") as span:
+            inject(carrier)
+            call = functools.partial(_run_in_process, carrier, fn, args)
+            return await self._submit("process", self.process_pool, self._process_slots, call, span)
+
+    async def _submit(
+        self,
+        kind: str,
+        pool: Executor,
+        slots: asyncio.Semaphore,
+        call: Callable,
+        span: trace.Span | None = None,
+    ) -> Any:
+        attributes = {"executor.kind": kind}
+        span = span or trace.get_current_span()
+        # Ожидание слота - тоже очередь: при насыщенном пуле основной backlog копится именно здесь
+        pending_counter.add(1, attributes)
+        submitted_at = time.time()
+        try:
+            async with slots:
+                started_at, result = await asyncio.get_running_loop().run_in_executor(pool, call)
+        finally:
+            pending_counter.add(-1, attributes)
+
+        finished_at = time.time()
+        wait_ms = max(started_at - submitted_at, 0) * 1000
+        wait_histogram.record(wait_ms, attributes)
+        run_histogram.record((finished_at - started_at) * 1000, attributes)
+        span.set_attribute(f"executor.{kind}.wait_ms", wait_ms)
+        return result
+
+    def shutdown(self) -> None:
+        self.thread_pool.shutdown(wait=True, cancel_futures=True)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=True, cancel_futures=True)
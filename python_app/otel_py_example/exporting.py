@@ -0,0 +1,308 @@
+"""
+Конвейер экспорта спанов: настраиваемый BatchSpanProcessor, выбор транспорта OTLP,
+fan-out в несколько бэкендов с независимыми очередями, спул на диск и self-telemetry очереди/экспорта
+"""
+
+import gzip
+import logging
+import threading
+import time
+from typing import Optional, Sequence
+from urllib.parse import urlparse
+
+from opentelemetry import metrics
+from opentelemetry.context import Context
+from opentelemetry.sdk._logs.export import LogExporter
+from opentelemetry.sdk.metrics.export import MetricExporter
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor, SynchronousMultiSpanProcessor
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+from otel_py_example.settings import Settings
+from otel_py_example.spool import PayloadSender, SpanSpool, SpoolingSpanExporter, spool_directory
+
+logger = logging.getLogger(__name__)
+
+meter = metrics.get_meter(__name__)
+
+exported_counter = meter.create_counter("otel.exporter.spans.exported", description="Spans handed to the exporter")
+failed_counter = meter.create_counter("otel.exporter.spans.failed", description="Spans in failed export calls")
+dropped_counter = meter.create_counter(
+    "otel.exporter.spans.dropped", description="Spans dropped because the processor queue was full"
+)
+export_duration = meter.create_histogram(
+    "otel.exporter.export.duration", unit="ms", description="Duration of one export call"
+)
+
+
+def create_span_exporter(endpoint: str, settings: Settings, timeout_millis: int | None = None) -> SpanExporter:
+    timeout = (timeout_millis or settings.otlp_export_timeout_millis) / 1000
+    gzip = settings.otlp_compression == "gzip"
+
+    if settings.otlp_protocol == "http/protobuf":
+        from opentelemetry.exporter.otlp.proto.http import Compression
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(
+            endpoint=http_signal_endpoint(endpoint, "traces"),
+            timeout=timeout,
+            compression=Compression.Gzip if gzip else Compression.NoCompression,
+        )
+
+    if settings.otlp_protocol == "grpc":
+        from grpc import Compression
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(
+            endpoint=endpoint,
+            timeout=timeout,
+            compression=Compression.Gzip if gzip else Compression.NoCompression,
+        )
+
+    raise ValueError(f"Unknown OTLP protocol: {settings.otlp_protocol}")
+
+
+def create_metric_exporter(endpoint: str, settings: Settings) -> MetricExporter:
+    timeout = settings.otlp_export_timeout_millis / 1000
+    gzip = settings.otlp_compression == "gzip"
+
+    if settings.otlp_protocol == "http/protobuf":
+        from opentelemetry.exporter.otlp.proto.http import Compression
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+
+        return OTLPMetricExporter(
+            endpoint=http_signal_endpoint(endpoint, "metrics"),
+            timeout=timeout,
+            compression=Compression.Gzip if gzip else Compression.NoCompression,
+        )
+
+    if settings.otlp_protocol == "grpc":
+        from grpc import Compression
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+
+        return OTLPMetricExporter(
+            endpoint=endpoint,
+            timeout=timeout,
+            compression=Compression.Gzip if gzip else Compression.NoCompression,
+        )
+
+    raise ValueError(f"Unknown OTLP protocol: {settings.otlp_protocol}")
+
+
+def create_log_exporter(endpoint: str, settings: Settings) -> LogExporter:
+    timeout = settings.otlp_export_timeout_millis / 1000
+    gzip = settings.otlp_compression == "gzip"
+
+    if settings.otlp_protocol == "http/protobuf":
+        from opentelemetry.exporter.otlp.proto.http import Compression
+        from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
+
+        return OTLPLogExporter(
+            endpoint=http_signal_endpoint(endpoint, "logs"),
+            timeout=timeout,
+            compression=Compression.Gzip if gzip else Compression.NoCompression,
+        )
+
+    if settings.otlp_protocol == "grpc":
+        from grpc import Compression
+        from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter
+
+        return OTLPLogExporter(
+            endpoint=endpoint,
+            timeout=timeout,
+            compression=Compression.Gzip if gzip else Compression.NoCompression,
+        )
+
+    raise ValueError(f"Unknown OTLP protocol: {settings.otlp_protocol}")
+
+
+class HttpSpanPayloadSender:
+    """
+    Готовый ExportTraceServiceRequest в /v1/traces
+    """
+
+    def __init__(self, endpoint: str, settings: Settings):
+        import httpx
+
+        self.url = http_signal_endpoint(endpoint, "traces")
+        self.gzip = settings.otlp_compression == "gzip"
+        self.headers = {"Content-Type": "application/x-protobuf"}
+        if self.gzip:
+            self.headers["Content-Encoding"] = "gzip"
+        self.client = httpx.Client(timeout=settings.otlp_export_timeout_millis / 1000)
+        self.errors = (httpx.HTTPError,)
+
+    def send(self, payload: bytes) -> bool:
+        try:
+            response = self.client.post(
+                self.url, content=gzip.compress(payload) if self.gzip else payload, headers=self.headers
+            )
+        except self.errors:
+            return False
+        return response.is_success
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class GrpcSpanPayloadSender:
+    """
+    Готовый ExportTraceServiceRequest в TraceService/Export: без сериализатора gRPC отправляет байты как есть
+    """
+
+    def __init__(self, endpoint: str, settings: Settings):
+        import grpc
+
+        parsed = urlparse(endpoint)
+        target = parsed.netloc or endpoint
+        compression = grpc.Compression.Gzip if settings.otlp_compression == "gzip" else grpc.Compression.NoCompression
+        if parsed.scheme == "https":
+            self.channel = grpc.secure_channel(target, grpc.ssl_channel_credentials(), compression=compression)
+        else:
+            self.channel = grpc.insecure_channel(target, compression=compression)
+        self.export = self.channel.unary_unary("/opentelemetry.proto.collector.trace.v1.TraceService/Export")
+        self.timeout = settings.otlp_export_timeout_millis / 1000
+        self.errors = (grpc.RpcError,)
+
+    def send(self, payload: bytes) -> bool:
+        try:
+            self.export(payload, timeout=self.timeout)
+        except self.errors:
+            return False
+        return True
+
+    def close(self) -> None:
+        self.channel.close()
+
+
+def create_span_payload_sender(endpoint: str, settings: Settings) -> PayloadSender:
+    if settings.otlp_protocol == "http/protobuf":
+        return HttpSpanPayloadSender(endpoint, settings)
+    if settings.otlp_protocol == "grpc":
+        return GrpcSpanPayloadSender(endpoint, settings)
+    raise ValueError(f"Unknown OTLP protocol: {settings.otlp_protocol}")
+
+
+def create_spooling_span_exporter(endpoint: str, settings: Settings) -> SpanExporter:
+    if not settings.otlp_spool_enabled:
+        return create_span_exporter(endpoint, settings)
+    # Экспортёр SDK ретраит до своего таймаута, блокируя поток BatchSpanProcessor; со спулом
+    # ждать дольше нет смысла - батч уйдёт на диск
+    timeout_millis = min(settings.otlp_export_timeout_millis, settings.otlp_spool_export_timeout_millis)
+    exporter = create_span_exporter(endpoint, settings, timeout_millis)
+    try:
+        spool = SpanSpool(
+            spool_directory(settings, endpoint), settings.otlp_spool_max_bytes, settings.otlp_spool_segment_bytes
+        )
+    except OSError:
+        # Каталог спула недоступен - экспорт без спула, но воркер стартует
+        logger.exception("Span spool unavailable, exporting without it")
+        return exporter
+    return SpoolingSpanExporter(exporter, create_span_payload_sender(endpoint, settings), spool, endpoint, settings)
+
+
+def http_signal_endpoint(endpoint: str, signal: str) -> str:
+    # Для HTTP коллектор слушает /v1/<signal> (порт 4318)
+    if urlparse(endpoint).path in ("", "/"):
+        return endpoint.rstrip("/") + f"/v1/{signal}"
+    return endpoint
+
+
+class MeteredSpanExporter(SpanExporter):
+    """
+    Считает отданные в экспорт спаны и время экспорта
+    """
+
+    def __init__(self, delegate: SpanExporter, name: str):
+        self.delegate = delegate
+        self.attributes = {"exporter": name}
+        self.taken = 0
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        with self._lock:
+            self.taken += len(spans)
+        started = time.perf_counter()
+        result = self.delegate.export(spans)
+        export_duration.record((time.perf_counter() - started) * 1000, self.attributes)
+        if result == SpanExportResult.SUCCESS:
+            exported_counter.add(len(spans), self.attributes)
+        else:
+            failed_counter.add(len(spans), self.attributes)
+        return result
+
+    def shutdown(self) -> None:
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+class MeteredBatchSpanProcessor(SpanProcessor):
+    """
+    BatchSpanProcessor с учётом глубины очереди и отброшенных спанов.
+
+    Внутренняя очередь BatchSpanProcessor закрыта, поэтому глубина считается снаружи:
+    поставлено в очередь минус отдано экспортёру
+    """
+
+    def __init__(self, exporter: SpanExporter, name: str, settings: Settings):
+        self.exporter = MeteredSpanExporter(exporter, name)
+        self.max_queue_size = settings.otlp_max_queue_size
+        self.delegate = BatchSpanProcessor(
+            self.exporter,
+            max_queue_size=settings.otlp_max_queue_size,
+            schedule_delay_millis=settings.otlp_schedule_delay_millis,
+            max_export_batch_size=settings.otlp_max_export_batch_size,
+            export_timeout_millis=settings.otlp_export_timeout_millis,
+        )
+        self.attributes = self.exporter.attributes
+        self.enqueued = 0
+        self._lock = threading.Lock()
+
+    @property
+    def queue_size(self) -> int:
+        return max(self.enqueued - self.exporter.taken, 0)
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None) -> None:
+        self.delegate.on_start(span, parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if not span.context.trace_flags.sampled:
+            return
+        with self._lock:
+            dropped = self.queue_size >= self.max_queue_size
+            if not dropped:
+                self.enqueued += 1
+        if dropped:
+            dropped_counter.add(1, self.attributes)
+        self.delegate.on_end(span)
+
+    def shutdown(self) -> None:
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+def build_span_processor(endpoint: str, settings: Settings) -> SpanProcessor:
+    endpoints = [endpoint, *settings.otlp_extra_endpoints]
+    processors = [
+        MeteredBatchSpanProcessor(create_spooling_span_exporter(one_endpoint, settings), one_endpoint, settings)
+        for one_endpoint in endpoints
+    ]
+
+    def observe_queue(options):
+        return [metrics.Observation(processor.queue_size, processor.attributes) for processor in processors]
+
+    meter.create_observable_gauge(
+        "otel.exporter.queue.size", callbacks=[observe_queue], description="Spans waiting in the processor queue"
+    )
+
+    if len(processors) == 1:
+        return processors[0]
+    # У каждого бэкенда свой BatchSpanProcessor (своя очередь и поток экспорта):
+    # медленный бэкенд не тормозит остальные, on_end только кладёт спан в очереди
+    fan_out = SynchronousMultiSpanProcessor()
+    for processor in processors:
+        fan_out.add_span_processor(processor)
+    return fan_out
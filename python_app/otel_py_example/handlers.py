@@ -0,0 +1,70 @@
+from typing import AsyncIterator
+
+from loguru import logger
+
+from otel_py_example.bulk import ingest
+from otel_py_example.models.rows import EntityRow
+from otel_py_example.schemas import EntityCreateModel
+from otel_py_example.repository.entities import EntitiesRepo
+
+
+class PaginationMixin:
+    # Строки сразу в EntityRow, без ORM объектов и dict: их кодирует FastJSONResponse
+    async def get_entities_page(self, limit: int, after: int = 0) -> tuple[list[EntityRow], int | None]:
+        rows = await self.repository.get_entities_page(limit, after)
+        entities = [EntityRow.from_row(row) for row in rows]
+        # Курсор следующей страницы - последний id, если страница заполнена целиком
+        next_after = entities[-1].id if len(entities) == limit else None
+        return entities, next_after
+
+    async def stream_entities(self, batch_size: int, after: int = 0) -> AsyncIterator[list[EntityRow]]:
+        async for batch in self.repository.stream_entities(batch_size, after):
+            yield [EntityRow.from_row(row) for row in batch]
+
+    async def bulk_create(self, items: AsyncIterator[tuple[int, EntityCreateModel | str]], batch_size: int) -> dict:
+        return await ingest(items, self.repository.bulk_create, batch_size)
+
+
+class EntitiesHandler(PaginationMixin):
+    def __init__(self, repository: EntitiesRepo):
+        self.repository = repository
+
+    async def get_entity_by_id(self, entity_id: str) -> dict | None:
+        result = await self.repository.get_entity_by_id(entity_id)
+        if result:
+            return {"name": result.name, "description": result.description, "id": result.id}
+        return None
+
+    async def get_all_entities(self) -> list[dict]:
+        data = await self.repository.get_all_entities()
+        result = []
+        for one_data in data:
+            result.append({"name": one_data.name, "description": one_data.description, "id": one_data.id})
+        return result
+
+    async def create_entity(self, name: str, description: str) -> bool:
+        await self.repository.create_entity(name, description)
+        return True
+
+
+class EntitiesHandlerAsyncpg(PaginationMixin):
+    def __init__(self, repository: EntitiesRepo):
+        self.repository = repository
+
+    async def get_entity_by_id(self, entity_id: str) -> dict | None:
+        result = await self.repository.get_entity_by_id(entity_id)
+        if result:
+            return {"name": result.name, "description": result.description, "id": result.id}
+        return None
+
+    async def get_all_entities(self) -> list[dict]:
+        data = await self.repository.get_all_entities()
+        result = []
+        for one_data in data:
+            result.append({"name": one_data.name, "description": one_data.description, "id": one_data.id})
+        return result
+
+    async def create_entity(self, name: str, description: str) -> bool:
+        result = await self.repository.create_entity(name, description)
+        logger.debug(f"Created entity {result.id}")
+        return True
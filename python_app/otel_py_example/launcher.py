@@ -0,0 +1,36 @@
+"""
+Запуск uvicorn с несколькими воркерами
+"""
+
+import uvicorn
+from loguru import logger
+
+from otel_py_example.settings import Settings
+
+
+APP_IMPORT_STRING = "otel_py_example.app:create_app"
+
+
+def run(settings: Settings) -> None:
+    workers = settings.workers_count
+    logger.info(f"fastapi-app start, listening on port {settings.expose_port} with {workers} worker(s)")
+    connections = workers * settings.worker_db_connections
+    if connections > settings.postgres_max_connections:
+        logger.warning(
+            f"{workers} worker(s) may open up to {connections} Postgres connections, "
+            f"max_connections is {settings.postgres_max_connections}: lower WORKERS or the pool sizes"
+        )
+    # Фабрика передаётся строкой импорта: каждый воркер собирает приложение сам и в lifespan
+    # создаёт свои TracerProvider, BatchSpanProcessor и пулы соединений.
+    # На SIGTERM uvicorn перестаёт принимать соединения и ждёт текущие запросы
+    # до timeout_graceful_shutdown, затем выполняет shutdown lifespan
+    uvicorn.run(
+        APP_IMPORT_STRING,
+        factory=True,
+        host="0.0.0.0",
+        port=settings.expose_port,
+        workers=workers,
+        loop="uvloop" if settings.server_uvloop else "asyncio",
+        http="httptools" if settings.server_httptools else "h11",
+        timeout_graceful_shutdown=settings.server_graceful_shutdown_timeout,
+    )
@@ -0,0 +1,238 @@
+"""
+Логирование: JSON в stderr из фоновой очереди loguru, trace_id/span_id из текущего спана,
+семплирование по уровням с лимитом записей в секунду и экспорт в коллектор по OTLP
+"""
+
+import inspect
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from typing import TextIO
+
+from loguru import logger
+from opentelemetry import metrics
+from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+from opentelemetry.sdk.resources import Resource
+
+from otel_py_example.exporting import create_log_exporter
+from otel_py_example.propagation import span_ids
+from otel_py_example.settings import Settings
+
+meter = metrics.get_meter(__name__)
+
+dropped_counter = meter.create_counter("logs.sampled_out", description="Log records dropped by sampling")
+
+# Ключ решения семплера в записи loguru
+SAMPLED_KEY = "_sampled"
+# Атрибуты LogRecord, которые нельзя передать через extra в makeRecord
+LOG_RECORD_RESERVED = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def add_trace_context(record: dict) -> None:
+    # patcher выполняется в потоке вызова logger.*, где ещё доступен контекст OTel
+    ids = span_ids()
+    record["extra"]["trace_id"] = ids.trace_id if ids is not None else None
+    record["extra"]["span_id"] = ids.span_id if ids is not None else None
+
+
+class LogSampler:
+    """
+    Фильтр loguru: доля записей по уровню и token bucket на уровень.
+
+    Решение запоминается в самой записи (не в extra - он уходит в атрибуты), чтобы все sink'и
+    (stderr, OTLP) получили одинаковый набор. Логируют и потоки пулов, поэтому бакеты под локом
+    """
+
+    def __init__(self, ratios: dict[str, float], rate_limit: float = 0):
+        self.ratios = {level.upper(): ratio for level, ratio in ratios.items()}
+        self.rate_limit = rate_limit
+        # level -> (токены, время последнего пополнения)
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record: dict) -> bool:
+        keep = record.get(SAMPLED_KEY)
+        if keep is None:
+            keep = record[SAMPLED_KEY] = self._decide(record["level"].name)
+            if not keep:
+                dropped_counter.add(1, {"level": record["level"].name})
+        return keep
+
+    def _decide(self, level: str) -> bool:
+        ratio = self.ratios.get(level)
+        if ratio is not None and random.random() >= ratio:
+            return False
+        if self.rate_limit <= 0:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(level, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+            if tokens < 1:
+                self._buckets[level] = (tokens, now)
+                return False
+            self._buckets[level] = (tokens - 1, now)
+            return True
+
+
+class JsonSink:
+    """
+    Сериализует запись в JSON уже в потоке очереди loguru (при enqueue=True)
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def write(self, message) -> None:
+        record = message.record
+        data = {
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "message": record["message"],
+            "logger": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+        }
+        for key, value in record["extra"].items():
+            if value is not None and not key.startswith("_"):
+                data[key] = value
+        if record["exception"] is not None:
+            # loguru дописывает traceback к отформатированному сообщению
+            data["exception"] = str(message)[len(record["message"]) :].strip()
+        self.stream.write(json.dumps(data, default=str) + "\n")
+        self.stream.flush()
+
+
+class OtlpSink:
+    """
+    loguru -> LoggingHandler. LogRecord собирается здесь: стандартный мост loguru кладёт весь extra
+    одним атрибутом, а traceback - и в тело, и в exception.stacktrace. Тело - только сообщение,
+    extra - плоскими атрибутами; trace_id/span_id OTel берёт из контекста сам
+    """
+
+    def __init__(self, handler: LoggingHandler):
+        self.handler = handler
+
+    def write(self, message) -> None:
+        record = message.record
+        exception = record["exception"]
+        attributes = {
+            key: value
+            for key, value in record["extra"].items()
+            if value is not None
+            and key not in ("trace_id", "span_id")
+            and not key.startswith("_")
+            and key not in LOG_RECORD_RESERVED
+        }
+        log_record = logging.getLogger(record["name"]).makeRecord(
+            record["name"],
+            record["level"].no,
+            record["file"].path,
+            record["line"],
+            record["message"],
+            (),
+            (exception.type, exception.value, exception.traceback) if exception else None,
+            record["function"],
+            attributes,
+        )
+        self.handler.handle(log_record)
+
+
+class LoggingState:
+    """
+    Общий для всех sink'ов фильтр и id sink'а OTLP, чтобы снять его при остановке воркера
+    """
+
+    def __init__(self):
+        self.sampler: LogSampler | None = None
+        self.otlp_handler_id: int | None = None
+
+
+_state = LoggingState()
+
+
+def text_format(record: dict) -> str:
+    trace_id = "{extra[trace_id]} " if record["extra"].get("trace_id") else ""
+    return "{time:DD.MM.YY HH:mm:ss} {level} " + trace_id + "{message}\n{exception}"
+
+
+class InterceptHandler(logging.Handler):
+    """
+    Перенаправляет stdlib logging (репозитории, ресурсы, библиотеки) в loguru
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            level: str | int = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+
+        # Ищем кадр вызова logging.*, чтобы function/line в записи были настоящими
+        frame, depth = inspect.currentframe(), 0
+        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+def configure_logging(settings: Settings) -> None:
+    logger.remove()
+    logger.configure(patcher=add_trace_context)
+
+    sampler = _state.sampler = LogSampler(settings.log_sample_ratios, settings.log_rate_limit)
+    if settings.log_json:
+        logger.add(
+            JsonSink(sys.stderr),
+            level=settings.log_level,
+            format="{message}",
+            filter=sampler,
+            enqueue=settings.log_enqueue,
+        )
+    else:
+        logger.add(
+            sys.stderr, level=settings.log_level, format=text_format, filter=sampler, enqueue=settings.log_enqueue
+        )
+
+    logging.basicConfig(handlers=[InterceptHandler()], level=logging.getLevelName(settings.log_level), force=True)
+    # httpx пишет INFO на каждый запрос (в т.ч. к second-app) - это уже есть в спанах
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def setting_logs(app_name: str, endpoint: str, settings: Settings) -> LoggerProvider | None:
+    """
+    OTLP экспорт логов. LoggingHandler берёт trace context из текущего контекста, поэтому этот sink
+    без enqueue - в фон запись уходит уже в BatchLogRecordProcessor
+    """
+    if not settings.log_otlp_enabled:
+        return None
+
+    resource = Resource.create(attributes={"service.name": app_name, "compose_service": app_name})
+    log_provider = LoggerProvider(resource=resource)
+    log_provider.add_log_record_processor(BatchLogRecordProcessor(create_log_exporter(endpoint, settings)))
+
+    sampler = _state.sampler or LogSampler(settings.log_sample_ratios, settings.log_rate_limit)
+
+    def otlp_filter(record: dict) -> bool:
+        # Ошибки самого экспорта не отправляем обратно в экспорт
+        return not (record["name"] or "").startswith("opentelemetry") and sampler(record)
+
+    _state.otlp_handler_id = logger.add(
+        OtlpSink(LoggingHandler(logger_provider=log_provider)),
+        level=settings.log_otlp_level,
+        format="{message}",
+        filter=otlp_filter,
+    )
+    return log_provider
+
+
+def shutdown_logs(log_provider: LoggerProvider | None) -> None:
+    if _state.otlp_handler_id is not None:
+        logger.remove(_state.otlp_handler_id)
+        _state.otlp_handler_id = None
+    if log_provider is not None:
+        log_provider.shutdown()
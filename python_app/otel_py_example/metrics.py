@@ -0,0 +1,145 @@
+"""
+RED метрики HTTP, длительность вызовов БД и Redis, заполненность пулов.
+
+Инструменты создаются один раз при импорте (через proxy meter, реальный MeterProvider появляется в lifespan),
+наборы атрибутов кэшируются - запись метрики на горячем пути ничего не аллоцирует.
+Клиенты БД импортируются только для аннотаций: модуль нужен уже в create_app, до старта пулов.
+Exemplar'ы с trace_id добавляет SDK: запись идёт внутри активного спана
+"""
+
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from opentelemetry import metrics
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+if TYPE_CHECKING:
+    import asyncpg
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+meter = metrics.get_meter(__name__)
+
+requests_counter = meter.create_counter("http.server.requests", description="Handled HTTP requests")
+errors_counter = meter.create_counter("http.server.errors", description="HTTP requests finished with 5xx or exception")
+request_duration = meter.create_histogram(
+    "http.server.request.duration", unit="ms", description="HTTP request duration by route"
+)
+db_duration = meter.create_histogram("db.client.operation.duration", unit="ms", description="Database call duration")
+db_statement_duration = meter.create_histogram(
+    "db.client.statement.duration", unit="ms", description="SQLAlchemy prebuilt statement duration by name"
+)
+redis_duration = meter.create_histogram("redis.client.operation.duration", unit="ms", description="Redis call duration")
+
+
+@lru_cache(maxsize=1024)
+def http_attributes(method: str, route: str, status_code: int) -> dict:
+    return {"http.method": method, "http.route": route, "http.status_code": status_code}
+
+
+@lru_cache(maxsize=256)
+def redis_attributes(command: str) -> dict:
+    return {"db.system": "redis", "db.operation": command}
+
+
+@lru_cache(maxsize=256)
+def statement_attributes(name: str) -> dict:
+    return {"db.system": "postgresql", "db.client": "sqlalchemy", "db.statement.name": name}
+
+
+SQLALCHEMY_ATTRIBUTES = {"db.system": "postgresql", "db.client": "sqlalchemy"}
+ASYNCPG_ATTRIBUTES = {"db.system": "postgresql", "db.client": "asyncpg"}
+ASYNCPG_ERROR_ATTRIBUTES = {**ASYNCPG_ATTRIBUTES, "error": True}
+
+
+class REDMetricsMiddleware:
+    """
+    Rate / Errors / Duration по шаблону роута (низкая кардинальность, в отличие от url.path).
+    Должна стоять внутри middleware FastAPIInstrumentor, чтобы серверный спан был текущим
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status_code = 500
+            raise
+        finally:
+            route = scope.get("route")
+            attributes = http_attributes(scope["method"], route.path if route is not None else "unmatched", status_code)
+            request_duration.record((time.perf_counter() - started) * 1000, attributes)
+            requests_counter.add(1, attributes)
+            if status_code >= 500:
+                errors_counter.add(1, attributes)
+
+
+def instrument_sqlalchemy_engine(engine: "AsyncEngine") -> None:
+    from sqlalchemy import event
+
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is not None:
+            db_duration.record((time.perf_counter() - started) * 1000, SQLALCHEMY_ATTRIBUTES)
+
+
+def asyncpg_query_logger(record) -> None:
+    attributes = ASYNCPG_ERROR_ATTRIBUTES if record.exception is not None else ASYNCPG_ATTRIBUTES
+    db_duration.record(record.elapsed * 1000, attributes)
+
+
+async def init_asyncpg_connection(conn: "asyncpg.Connection") -> None:
+    # Вызывается пулом для каждого нового соединения
+    conn.add_query_logger(asyncpg_query_logger)
+
+
+def register_pool_gauges(container) -> None:
+    def observe_asyncpg(options):
+        pool = container.asyncpg_pool
+        if pool is None:
+            return []
+        return [
+            metrics.Observation(pool.get_size() - pool.get_idle_size(), {"pool": "asyncpg", "state": "used"}),
+            metrics.Observation(pool.get_idle_size(), {"pool": "asyncpg", "state": "idle"}),
+            metrics.Observation(pool.get_max_size(), {"pool": "asyncpg", "state": "max"}),
+        ]
+
+    def observe_sqlalchemy(options):
+        engine = container.database_engine
+        if engine is None:
+            return []
+        pool = engine.pool
+        return [
+            metrics.Observation(pool.checkedout(), {"pool": "sqlalchemy", "state": "used"}),
+            metrics.Observation(pool.checkedin(), {"pool": "sqlalchemy", "state": "idle"}),
+            metrics.Observation(
+                container.settings.database_pool_size + container.settings.database_max_overflow,
+                {"pool": "sqlalchemy", "state": "max"},
+            ),
+        ]
+
+    meter.create_observable_gauge(
+        "db.client.connections", callbacks=[observe_asyncpg, observe_sqlalchemy], description="Connection pool usage"
+    )
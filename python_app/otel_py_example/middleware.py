@@ -2,83 +2,77 @@
 Middleware для обработки trace_id из фронтенда
 """
 
-import uuid
-from typing import Callable, Optional
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Optional
+from fastapi import Request
 from opentelemetry import trace
-from opentelemetry.trace import SpanKind, Status, StatusCode
-from opentelemetry.propagate import extract
-from opentelemetry.context import Context
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from loguru import logger
 
+from otel_py_example.propagation import span_ids
 
-class TraceIDMiddleware(BaseHTTPMiddleware):
+
+class TraceIDMiddleware:
     """
-    Middleware для обработки trace_id, переданного из фронтенда
+    Middleware для обработки trace_id, переданного из фронтенда.
+
+    Чистый ASGI: без BaseHTTPMiddleware (лишняя задача и memory stream на каждый запрос)
+    и без второго SERVER спана - атрибуты пишутся в спан, созданный FastAPIInstrumentor
     """
 
-    def __init__(self, app, trace_header_name: str = "X-Trace-ID"):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, trace_header_name: str = "X-Trace-ID"):
+        self.app = app
         self.trace_header_name = trace_header_name
-        self.tracer = trace.get_tracer(__name__)
+        self._header_key = trace_header_name.lower().encode("latin-1")
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Извлекаем trace_id из заголовка
-        frontend_trace_id = request.headers.get(self.trace_header_name)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # Получаем контекст из стандартных заголовков OpenTelemetry (если есть)
-        carrier = dict(request.headers)
-        parent_context = extract(carrier)
+        # Извлекаем trace_id из заголовка прямо из scope, без сборки Headers/URL
+        frontend_trace_id = None
+        for key, value in scope["headers"]:
+            if key == self._header_key:
+                frontend_trace_id = value.decode("latin-1")
+                break
 
         # Если фронтенд передал свой trace_id, логируем его
         if frontend_trace_id:
             logger.info(f"Received trace_id from frontend: {frontend_trace_id}")
 
-        # Создаем новый спан для этого запроса
-        with self.tracer.start_as_current_span(
-            name=f"{request.method} {request.url.path}",
-            context=parent_context,
-            kind=SpanKind.SERVER,
-        ) as span:
-            # Добавляем атрибуты к спану
-            span.set_attribute("http.method", request.method)
-            span.set_attribute("http.url", str(request.url))
-            span.set_attribute("http.route", request.url.path)
-
-            if frontend_trace_id:
-                span.set_attribute("frontend.trace_id", frontend_trace_id)
-                span.set_attribute("custom.trace_id", frontend_trace_id)
-
-            # Сохраняем trace_id в request state для использования в handlers
-            request.state.frontend_trace_id = frontend_trace_id
-            request.state.otel_trace_id = trace.format_trace_id(span.get_span_context().trace_id)
-
-            try:
-                # Выполняем запрос
-                response = await call_next(request)
-
-                # Добавляем статус код в спан
-                span.set_attribute("http.status_code", response.status_code)
-
-                if response.status_code >= 400:
-                    span.set_status(Status(StatusCode.ERROR))
-                else:
-                    span.set_status(Status(StatusCode.OK))
-
-                # Добавляем trace_id в заголовки ответа для фронтенда
-                response.headers["X-Backend-Trace-ID"] = request.state.otel_trace_id
+        span = trace.get_current_span()
+        # Идентификаторы форматируются один раз на спан и переиспользуются в handlers
+        trace_ids = span_ids(span)
+        otel_trace_id = trace_ids.trace_id if trace_ids is not None else None
+
+        # Добавляем атрибуты к серверному спану
+        if frontend_trace_id and span.is_recording():
+            span.set_attribute("frontend.trace_id", frontend_trace_id)
+            span.set_attribute("custom.trace_id", frontend_trace_id)
+
+        # Сохраняем trace_id в request state для использования в handlers
+        state = scope.setdefault("state", {})
+        state["frontend_trace_id"] = frontend_trace_id
+        state["otel_trace_id"] = otel_trace_id
+        state["trace_ids"] = trace_ids
+
+        async def send_with_trace_headers(message: Message) -> None:
+            # Добавляем trace_id в заголовки ответа для фронтенда (до отправки тела - работает и для стриминга)
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if otel_trace_id:
+                    headers.append((b"x-backend-trace-id", otel_trace_id.encode("latin-1")))
                 if frontend_trace_id:
-                    response.headers["X-Frontend-Trace-ID"] = frontend_trace_id
-
-                return response
+                    headers.append((b"x-frontend-trace-id", frontend_trace_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
 
-            except Exception as e:
-                # Записываем ошибку в спан
-                span.record_exception(e)
-                span.set_status(Status(StatusCode.ERROR, str(e)))
-                logger.error(f"Error processing request: {e}")
-                raise
+        try:
+            await self.app(scope, receive, send_with_trace_headers)
+        except Exception as e:
+            # Исключение в спан записывает FastAPIInstrumentor
+            logger.error(f"Error processing request: {e}")
+            raise
 
 
 def get_trace_id_from_request(request: Request) -> Optional[str]:
@@ -92,10 +86,8 @@ def get_current_trace_id() -> str:
     """
     Получить текущий OpenTelemetry trace_id
     """
-    current_span = trace.get_current_span()
-    if current_span and current_span.get_span_context().trace_id:
-        return trace.format_trace_id(current_span.get_span_context().trace_id)
-    return "unknown"
+    trace_ids = span_ids()
+    return trace_ids.trace_id if trace_ids is not None else "unknown"
 
 
 def create_child_span(name: str, attributes: dict = None) -> trace.Span:
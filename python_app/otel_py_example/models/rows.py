@@ -0,0 +1,19 @@
+"""
+Лёгкие DTO строк без ORM: __slots__ вместо __dict__ на каждый экземпляр,
+а dataclass orjson/msgspec сериализуют нативно, без промежуточного dict
+"""
+
+from dataclasses import dataclass
+from typing import Mapping
+
+
+@dataclass(slots=True)
+class EntityRow:
+    id: int
+    name: str
+    description: str | None
+
+    @classmethod
+    def from_row(cls, row: Mapping) -> "EntityRow":
+        # asyncpg Record и SQLAlchemy RowMapping поддерживают доступ по имени колонки
+        return cls(row["id"], row["name"], row["description"])
@@ -0,0 +1,96 @@
+"""
+Быстрый путь для trace context: отформатированные trace_id/span_id и traceparent
+считаются один раз на спан и кэшируются на нём самом (и в request state через TraceIDMiddleware)
+"""
+
+from typing import MutableMapping, NamedTuple, Optional
+
+from opentelemetry import baggage, trace
+from opentelemetry.propagate import get_global_textmap, inject
+from starlette.requests import Request
+
+# Поле на объекте спана, в котором лежат посчитанные TraceIds
+_CACHE_ATTR = "_otel_py_example_trace_ids"
+
+W3C_FIELDS = frozenset({"traceparent", "tracestate", "baggage"})
+
+
+class TraceIds(NamedTuple):
+    trace_id: str
+    span_id: str
+    traceparent: str
+    tracestate: Optional[str]
+
+
+def span_ids(span: Optional[trace.Span] = None) -> Optional[TraceIds]:
+    """
+    TraceIds текущего (или переданного) спана, None - если контекст невалидный
+    """
+    if span is None:
+        span = trace.get_current_span()
+    ids = getattr(span, _CACHE_ATTR, None)
+    if ids is not None:
+        return ids
+
+    span_context = span.get_span_context()
+    if not span_context.is_valid:
+        return None
+
+    trace_id = format(span_context.trace_id, "032x")
+    span_id = format(span_context.span_id, "016x")
+    ids = TraceIds(
+        trace_id=trace_id,
+        span_id=span_id,
+        traceparent=f"00-{trace_id}-{span_id}-{span_context.trace_flags:02x}",
+        tracestate=span_context.trace_state.to_header() if span_context.trace_state else None,
+    )
+    try:
+        setattr(span, _CACHE_ATTR, ids)
+    except AttributeError:
+        # Спан без __dict__ - просто не кэшируем
+        pass
+    return ids
+
+
+def request_trace_id(request: Optional[Request] = None) -> str:
+    """
+    trace_id для ответа/логов: из request state (посчитан в middleware), иначе из текущего спана
+    """
+    if request is not None:
+        ids = request.scope.get("state", {}).get("trace_ids")
+        if ids is not None:
+            return ids.trace_id
+    ids = span_ids()
+    return ids.trace_id if ids is not None else "unknown"
+
+
+_fast_path_checked: tuple[object, bool] = (None, False)
+
+
+def _can_fast_path() -> bool:
+    # Писать traceparent руками можно, только если глобальный пропагатор - W3C (по умолчанию tracecontext,baggage)
+    global _fast_path_checked
+    propagator = get_global_textmap()
+    if _fast_path_checked[0] is not propagator:
+        _fast_path_checked = (propagator, propagator.fields <= W3C_FIELDS)
+    return _fast_path_checked[1]
+
+
+def inject_trace_headers(
+    headers: MutableMapping[str, str], span: Optional[trace.Span] = None
+) -> MutableMapping[str, str]:
+    """
+    Пишет traceparent/tracestate в переданный (заранее созданный) словарь заголовков.
+
+    Если настроен не W3C пропагатор или в контексте есть baggage - обычный opentelemetry.propagate.inject
+    """
+    if _can_fast_path() and not baggage.get_all():
+        ids = span_ids(span)
+        if ids is not None:
+            headers["traceparent"] = ids.traceparent
+            if ids.tracestate:
+                headers["tracestate"] = ids.tracestate
+        return headers
+
+    inject(headers, context=trace.set_span_in_context(span) if span is not None else None)
+    return headers
@@ -0,0 +1,167 @@
+"""
+Read-through кэш сущностей в Redis перед репозиториями EntitiesRepository / EntitiesAsyncpgRepo
+"""
+
+import asyncio
+import json
+import logging
+import pickle
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Mapping, Sequence
+
+from opentelemetry import trace
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from otel_py_example.models.rows import EntityRow
+from otel_py_example.repository.entities import EntitiesRepo
+from otel_py_example.repository.local_cache import MISSING, CacheInvalidationBus, LocalCache
+from otel_py_example.resilience import detached_context, wait_shared
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+
+SERIALIZERS: dict[str, tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (lambda data: json.dumps(data).encode(), json.loads),
+    # pickle только для доверенного Redis
+    "pickle": (pickle.dumps, pickle.loads),
+}
+
+
+def entity_to_dict(entity) -> dict | None:
+    if entity is None:
+        return None
+    return {"id": entity.id, "name": entity.name, "description": entity.description}
+
+
+def entity_from_dict(data: dict | None) -> EntityRow | None:
+    if data is None:
+        return None
+    return EntityRow(**data)
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные загрузки одного ключа в один вызов (защита от cache stampede)
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            # Загрузка общая - без дедлайна первого запроса; каждый ждёт её в пределах своего
+            task = asyncio.get_running_loop().create_task(fn(), context=detached_context())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await wait_shared(task, "cache load")
+
+
+class CachedEntitiesRepo:
+    def __init__(
+        self,
+        repository: EntitiesRepo,
+        redis: aioredis.Redis,
+        prefix: str = "entities",
+        ttl: int = 60,
+        negative_ttl: int = 5,
+        serializer: str = "json",
+        local_cache: LocalCache | None = None,
+        invalidation_bus: CacheInvalidationBus | None = None,
+    ):
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown cache serializer: {serializer}")
+        self.repository = repository
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.dumps, self.loads = SERIALIZERS[serializer]
+        self.single_flight = SingleFlight()
+        self.local_cache = local_cache
+        self.invalidation_bus = invalidation_bus
+
+    def key(self, entity_id: str | int) -> str:
+        return f"{self.prefix}:{int(entity_id)}"
+
+    async def get_entity_by_id(self, entity_id: str) -> EntityRow | None:
+        key = self.key(entity_id)
+        with tracer.start_as_current_span("cache get_entity_by_id") as span:
+            span.set_attribute("cache.key", key)
+
+            if self.local_cache is not None:
+                entity = self.local_cache.get(key)
+                if entity is not MISSING:
+                    span.set_attribute("cache.hit", True)
+                    span.set_attribute("cache.tier", "local")
+                    return entity
+
+            started = time.perf_counter()
+            cached = await self._get(key)
+            span.set_attribute("cache.lookup_ms", (time.perf_counter() - started) * 1000)
+
+            if cached is not None:
+                span.set_attribute("cache.hit", True)
+                span.set_attribute("cache.tier", "redis")
+                entity = entity_from_dict(self.loads(cached))
+                if self.local_cache is not None:
+                    self.local_cache.set(key, entity, len(cached))
+                return entity
+
+            span.set_attribute("cache.hit", False)
+            started = time.perf_counter()
+            entity = await self.single_flight.do(key, lambda: self._load(key, entity_id))
+            span.set_attribute("cache.load_ms", (time.perf_counter() - started) * 1000)
+            return entity
+
+    async def get_all_entities(self) -> list[EntityRow]:
+        return await self.repository.get_all_entities()
+
+    async def get_entities_page(self, limit: int, after: int = 0) -> Sequence[Mapping]:
+        return await self.repository.get_entities_page(limit, after)
+
+    def stream_entities(self, batch_size: int, after: int = 0) -> AsyncIterator[Sequence[Mapping]]:
+        return self.repository.stream_entities(batch_size, after)
+
+    async def create_entity(self, name: str, description: str) -> EntityRow:
+        entity = await self.repository.create_entity(name, description)
+        # Для нового id мог быть закэширован промах (None)
+        await self.invalidate(entity.id)
+        return entity
+
+    async def bulk_create(self, rows: list[tuple[str, str]]) -> int:
+        # id новых строк неизвестны (COPY их не возвращает), закэшированные промахи истекут по negative_ttl
+        return await self.repository.bulk_create(rows)
+
+    async def invalidate(self, entity_id: str | int) -> None:
+        key = self.key(entity_id)
+        try:
+            await self.redis.delete(key)
+        except RedisError as e:
+            logger.warning("Cache invalidation failed for %s: %s", entity_id, e)
+        if self.local_cache is not None:
+            if self.invalidation_bus is not None:
+                await self.invalidation_bus.invalidate(self.local_cache, key)
+            else:
+                self.local_cache.delete(key)
+
+    async def _load(self, key: str, entity_id: str) -> EntityRow | None:
+        entity = await self.repository.get_entity_by_id(entity_id)
+        data = self.dumps(entity_to_dict(entity))
+        if self.local_cache is not None:
+            self.local_cache.set(key, entity, len(data))
+        try:
+            await self.redis.set(key, data, ex=self.ttl if entity is not None else self.negative_ttl)
+        except RedisError as e:
+            logger.warning("Cache set failed for %s: %s", key, e)
+        return entity
+
+    async def _get(self, key: str) -> bytes | None:
+        try:
+            return await self.redis.get(key)
+        except RedisError as e:
+            # Redis недоступен - идём в базу, как при промахе
+            logger.warning("Cache get failed for %s: %s", key, e)
+            return None
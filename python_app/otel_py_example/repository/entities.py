@@ -1,59 +1,142 @@
-import sqlalchemy as sa
+from typing import AsyncIterator, Mapping, Protocol, Sequence
 
 from otel_py_example.models import tables
+from otel_py_example.models.rows import EntityRow
+from otel_py_example.repository import statements
+from otel_py_example.resilience import Policy, resilient, resilient_stream
 import asyncpg
-from otel_py_example.settings import settings
 import logging
 from sqlalchemy.ext import asyncio as sa_async
 
 logger = logging.getLogger(__name__)
 
 
+class EntitiesRepo(Protocol):
+    """
+    Общий интерфейс репозиториев сущностей (SQLAlchemy, asyncpg и кэш поверх них)
+    """
+
+    async def get_entity_by_id(self, entity_id: str) -> EntityRow | None: ...
+
+    async def get_all_entities(self) -> list[EntityRow]: ...
+
+    async def get_entities_page(self, limit: int, after: int = 0) -> Sequence[Mapping]: ...
+
+    def stream_entities(self, batch_size: int, after: int = 0) -> AsyncIterator[Sequence[Mapping]]: ...
+
+    async def create_entity(self, name: str, description: str) -> EntityRow: ...
+
+    async def bulk_create(self, rows: list[tuple[str, str]]) -> int: ...
+
+
 class EntitiesRepository:
-    def __init__(self, engine: sa_async.AsyncEngine):
+    """
+    Только SQLAlchemy Core и заранее собранные запросы из statements: без ORM объектов и сессий,
+    строки сразу в EntityRow
+    """
+
+    def __init__(self, engine: sa_async.AsyncEngine, policy: Policy | None = None):
         self.model = tables.Entity
         self.engine = engine
+        self.policy = policy
 
-    async def get_entity_by_id(self, entity_id: str) -> tables.Entity | None:
+    @resilient()
+    async def get_entity_by_id(self, entity_id: str) -> EntityRow | None:
         async with self.engine.connect() as conn:
-            query = sa.select(tables.Entity).where(tables.Entity.id == int(entity_id))
-            result_cursor = await conn.execute(query)
-            return result_cursor.scalar()
+            result_cursor = await statements.execute(conn, statements.ENTITY_BY_ID, {"entity_id": int(entity_id)})
+            result = result_cursor.mappings().first()
+        if result:
+            return EntityRow.from_row(result)
+        return None
+
+    @resilient()
+    async def get_all_entities(self) -> list[EntityRow]:
+        async with self.engine.connect() as conn:
+            result_cursor = await statements.execute(conn, statements.ALL_ENTITIES)
+            return [EntityRow.from_row(row) for row in result_cursor.mappings()]
 
-    async def get_all_entities(self) -> list[tables.Entity]:
+    @resilient()
+    async def get_entities_page(self, limit: int, after: int = 0) -> Sequence[Mapping]:
+        # Keyset-пагинация по id: без OFFSET, стоимость страницы не растёт с номером страницы
         async with self.engine.connect() as conn:
-            query = sa.select(tables.Entity)
-            result_cursor = await conn.execute(query)
+            result_cursor = await statements.execute(conn, statements.ENTITIES_PAGE, {"after": after, "limit": limit})
             return result_cursor.mappings().all()
 
-    async def create_entity(self, name: str, description: str) -> tables.Entity:
-        entity = tables.Entity(name=name, description=description)
+    @resilient_stream
+    async def stream_entities(self, batch_size: int, after: int = 0) -> AsyncIterator[Sequence[Mapping]]:
+        # Server-side курсор: в памяти держим только одну пачку строк
         async with self.engine.connect() as conn:
-            conn.add(entity)
-            await conn.commit()
-            return entity
+            result_cursor = await statements.stream(conn, statements.ENTITIES_AFTER, {"after": after}, batch_size)
+            async for partition in result_cursor.mappings().partitions(batch_size):
+                yield partition
 
+    @resilient(retry=False)
+    async def create_entity(self, name: str, description: str) -> EntityRow:
+        async with self.engine.begin() as conn:
+            result_cursor = await statements.execute(
+                conn, statements.INSERT_ENTITY, {"name": name, "description": description}
+            )
+            return EntityRow.from_row(result_cursor.mappings().one())
 
-class EntitiesAsyncpgRepo:
-    def __init__(self):
-        self.conn = None
+    @resilient(retry=False)
+    async def bulk_create(self, rows: list[tuple[str, str]]) -> int:
+        # Одна транзакция на пачку, executemany одного и того же запроса
+        async with self.engine.begin() as conn:
+            await statements.execute(
+                conn,
+                statements.INSERT_ENTITIES,
+                [{"name": name, "description": description} for name, description in rows],
+            )
+        return len(rows)
 
-    async def init(self):
-        self.conn = await asyncpg.connect(settings.database_dsn)
 
-    async def get_entity_by_id(self, entity_id: str) -> tables.Entity | None:
-        query = "SELECT * FROM entities WHERE id = $1"
-        result = await self.conn.fetchrow(query, int(entity_id))
+class EntitiesAsyncpgRepo:
+    def __init__(self, pool: asyncpg.Pool, policy: Policy | None = None):
+        self.pool = pool
+        self.policy = policy
+
+    @resilient()
+    async def get_entity_by_id(self, entity_id: str) -> EntityRow | None:
+        query = "SELECT id, name, description FROM entities WHERE id = $1"
+        async with self.pool.acquire() as conn:
+            result = await conn.fetchrow(query, int(entity_id))
         if result:
-            return tables.Entity(**result)
+            return EntityRow.from_row(result)
         return None
 
-    async def get_all_entities(self) -> list[tables.Entity]:
-        query = "SELECT * FROM entities"
-        result = await self.conn.fetch(query)
-        return [tables.Entity(**one_result) for one_result in result]
+    @resilient()
+    async def get_all_entities(self) -> list[EntityRow]:
+        query = "SELECT id, name, description FROM entities"
+        async with self.pool.acquire() as conn:
+            result = await conn.fetch(query)
+        return [EntityRow.from_row(one_result) for one_result in result]
+
+    @resilient()
+    async def get_entities_page(self, limit: int, after: int = 0) -> Sequence[Mapping]:
+        query = "SELECT id, name, description FROM entities WHERE id > $1 ORDER BY id LIMIT $2"
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(query, after, limit)
+
+    @resilient_stream
+    async def stream_entities(self, batch_size: int, after: int = 0) -> AsyncIterator[Sequence[Mapping]]:
+        query = "SELECT id, name, description FROM entities WHERE id > $1 ORDER BY id"
+        async with self.pool.acquire() as conn:
+            # Курсоры asyncpg работают только внутри транзакции
+            async with conn.transaction():
+                cursor = await conn.cursor(query, after)
+                while batch := await cursor.fetch(batch_size):
+                    yield batch
+
+    @resilient(retry=False)
+    async def create_entity(self, name: str, description: str) -> EntityRow:
+        query = "INSERT INTO entities (name, description) VALUES ($1, $2) RETURNING id, name, description"
+        async with self.pool.acquire() as conn:
+            result = await conn.fetchrow(query, name, description)
+        return EntityRow.from_row(result)
 
-    async def create_entity(self, name: str, description: str) -> tables.Entity:
-        query = "INSERT INTO entities (name, description) VALUES ($1, $2) RETURNING *"
-        result = await self.conn.fetchrow(query, name, description)
-        return tables.Entity(**result)
+    @resilient(retry=False)
+    async def bulk_create(self, rows: list[tuple[str, str]]) -> int:
+        # COPY ... FROM STDIN в бинарном формате - самый быстрый способ залить пачку
+        async with self.pool.acquire() as conn:
+            await conn.copy_records_to_table("entities", records=rows, columns=["name", "description"])
+        return len(rows)
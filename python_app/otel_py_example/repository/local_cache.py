@@ -0,0 +1,173 @@
+"""
+In-process LRU/TTL кэш (L1) перед Redis и инвалидация между воркерами через Redis pub/sub
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any
+
+from opentelemetry import metrics
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+
+MISSING = object()
+
+hits_counter = meter.create_counter("cache.local.hits", description="L1 cache hits")
+misses_counter = meter.create_counter("cache.local.misses", description="L1 cache misses")
+evictions_counter = meter.create_counter("cache.local.evictions", description="L1 cache evictions")
+
+
+class LocalCache:
+    def __init__(self, name: str, max_items: int = 10_000, max_bytes: int = 16 * 1024 * 1024, ttl: float = 5.0):
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # key -> (expires_at, size, value)
+        self._data: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self._attributes = {"cache.name": name}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            misses_counter.add(1, self._attributes)
+            return MISSING
+
+        expires_at, _, value = item
+        if expires_at < time.monotonic():
+            self._pop(key)
+            misses_counter.add(1, self._attributes)
+            return MISSING
+
+        self._data.move_to_end(key)
+        hits_counter.add(1, self._attributes)
+        return value
+
+    def set(self, key: str, value: Any, size: int | None = None) -> None:
+        if size is None:
+            size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+
+        self._pop(key)
+        self._data[key] = (time.monotonic() + self.ttl, size, value)
+        self._bytes += size
+
+        evicted = 0
+        while len(self._data) > self.max_items or self._bytes > self.max_bytes:
+            _, (_, old_size, _) = self._data.popitem(last=False)
+            self._bytes -= old_size
+            evicted += 1
+        if evicted:
+            evictions_counter.add(evicted, self._attributes)
+
+    def delete(self, key: str) -> None:
+        self._pop(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def _pop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[1]
+
+
+class CacheInvalidationBus:
+    """
+    Рассылает инвалидации L1 кэшей всем воркерам/репликам через Redis pub/sub
+    """
+
+    def __init__(self, redis: aioredis.Redis, channel: str = "cache-invalidation", reconnect_delay: float = 1.0):
+        self.redis = redis
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.caches: dict[str, LocalCache] = {}
+        self._task: asyncio.Task | None = None
+
+        meter.create_observable_gauge(
+            "cache.local.items", callbacks=[self._observe_items], description="Items in L1 cache"
+        )
+        meter.create_observable_gauge(
+            "cache.local.size", callbacks=[self._observe_size], unit="By", description="Estimated L1 cache size"
+        )
+
+    def register(self, cache: LocalCache) -> LocalCache:
+        self.caches[cache.name] = cache
+        return cache
+
+    async def invalidate(self, cache: LocalCache, key: str) -> None:
+        cache.delete(key)
+        try:
+            await self.redis.publish(self.channel, f"{cache.name}|{key}")
+        except RedisError as e:
+            logger.warning("Failed to publish invalidation for %s|%s: %s", cache.name, key, e)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+        self._task.add_done_callback(self._on_listener_done)
+
+    def _on_listener_done(self, task: asyncio.Task) -> None:
+        # Слушатель сам не завершается: без него L1 кэши воркера отдают устаревшие данные до TTL
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Cache invalidation listener died", exc_info=task.exception())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    self._apply(message["data"])
+            except RedisError as e:
+                logger.warning("Cache invalidation subscription lost: %s", e)
+            except Exception:
+                # Любая другая ошибка (битое сообщение, сбой сокета) тоже не должна останавливать слушателя
+                logger.exception("Cache invalidation listener failed, resubscribing")
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception as e:
+                    logger.warning("Failed to close cache invalidation subscription: %s", e)
+            # Пока подписки не было, инвалидации могли потеряться - сбрасываем L1 целиком
+            for cache in self.caches.values():
+                cache.clear()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _apply(self, data: str | bytes) -> None:
+        if isinstance(data, bytes):
+            data = data.decode()
+        name, _, key = data.partition("|")
+        cache = self.caches.get(name)
+        if cache is not None:
+            cache.delete(key)
+
+    def _observe_items(self, options):
+        return [metrics.Observation(len(cache), {"cache.name": name}) for name, cache in self.caches.items()]
+
+    def _observe_size(self, options):
+        return [metrics.Observation(cache.size_bytes, {"cache.name": name}) for name, cache in self.caches.items()]
@@ -1,21 +1,57 @@
 from redis import asyncio as aioredis
-from otel_py_example.settings import settings
+
+from otel_py_example.repository.local_cache import MISSING, CacheInvalidationBus, LocalCache
+from otel_py_example.resilience import Policy
 
 
 KEY = "SUPER-KEY"
 
 
 class RedisRepo:
-    def __init__(self):
-        self.conn = aioredis.from_url(f"redis://{settings.redis_host}:{settings.redis_port}", decode_responses=True)
+    def __init__(
+        self,
+        conn: aioredis.Redis,
+        local_cache: LocalCache | None = None,
+        invalidation_bus: CacheInvalidationBus | None = None,
+        policy: Policy | None = None,
+    ):
+        self.conn = conn
+        self.local_cache = local_cache
+        self.invalidation_bus = invalidation_bus
+        self.policy = policy
 
     async def set_val(self, value):
-        await self.conn.set(KEY, value)
+        await self._execute(lambda: self.conn.set(KEY, value))
+        await self._invalidate()
         return True
 
     async def get_value(self):
-        return await self.conn.get(KEY)
+        if self.local_cache is not None:
+            value = self.local_cache.get(KEY)
+            if value is not MISSING:
+                return value
+
+        # Попадание в локальный кэш не зависит от состояния Redis, через breaker идёт только сам запрос
+        value = await self._execute(lambda: self.conn.get(KEY))
+        if self.local_cache is not None:
+            self.local_cache.set(KEY, value)
+        return value
 
     async def delete_value(self):
-        await self.conn.delete(KEY)
+        await self._execute(lambda: self.conn.delete(KEY))
+        await self._invalidate()
         return True
+
+    async def _execute(self, command):
+        # SET/GET/DELETE одного ключа идемпотентны - ретраи допустимы
+        if self.policy is None:
+            return await command()
+        return await self.policy.call(command)
+
+    async def _invalidate(self):
+        if self.local_cache is None:
+            return
+        if self.invalidation_bus is not None:
+            await self.invalidation_bus.invalidate(self.local_cache, KEY)
+        else:
+            self.local_cache.delete(KEY)
@@ -0,0 +1,70 @@
+"""
+Заранее собранные запросы SQLAlchemy Core для EntitiesRepository.
+
+Объекты statement'ов создаются один раз при импорте, значения передаются только bind-параметрами:
+ключ кэша компиляции мемоизирован на самом объекте, поэтому на вызове нет ни построения select(),
+ни обхода дерева - SQL сразу берётся из кэша движка (query_cache_size). Текст запроса постоянный,
+и asyncpg-диалект переиспользует prepared statement соединения (prepared_statement_cache_size).
+Длительность каждого вызова пишется в db.client.statement.duration с именем запроса
+"""
+
+import time
+from typing import Any, NamedTuple
+
+import sqlalchemy as sa
+from sqlalchemy.ext import asyncio as sa_async
+
+from otel_py_example.metrics import db_statement_duration, statement_attributes
+from otel_py_example.models import tables
+
+
+class Statement(NamedTuple):
+    name: str
+    query: sa.Executable
+
+
+entities = tables.Entity.__table__
+columns = (entities.c.id, entities.c.name, entities.c.description)
+
+ENTITY_BY_ID = Statement("entity_by_id", sa.select(*columns).where(entities.c.id == sa.bindparam("entity_id")))
+ALL_ENTITIES = Statement("all_entities", sa.select(*columns))
+# Keyset-пагинация: limit тоже bind-параметр, иначе каждый размер страницы - отдельная запись кэша
+ENTITIES_PAGE = Statement(
+    "entities_page",
+    sa.select(*columns)
+    .where(entities.c.id > sa.bindparam("after"))
+    .order_by(entities.c.id)
+    .limit(sa.bindparam("limit")),
+)
+ENTITIES_AFTER = Statement(
+    "entities_after", sa.select(*columns).where(entities.c.id > sa.bindparam("after")).order_by(entities.c.id)
+)
+INSERT_ENTITY = Statement(
+    "insert_entity",
+    sa.insert(entities).values(name=sa.bindparam("name"), description=sa.bindparam("description")).returning(*columns),
+)
+# Со списком параметров - executemany: asyncpg выполняет один prepared statement пачкой
+INSERT_ENTITIES = Statement(
+    "insert_entities", sa.insert(entities).values(name=sa.bindparam("name"), description=sa.bindparam("description"))
+)
+
+
+async def execute(
+    conn: sa_async.AsyncConnection, statement: Statement, parameters: dict | list[dict] | None = None
+) -> sa.CursorResult[Any]:
+    started = time.perf_counter()
+    try:
+        return await conn.execute(statement.query, parameters)
+    finally:
+        db_statement_duration.record((time.perf_counter() - started) * 1000, statement_attributes(statement.name))
+
+
+async def stream(
+    conn: sa_async.AsyncConnection, statement: Statement, parameters: dict, batch_size: int
+) -> sa_async.AsyncResult:
+    # yield_per через параметры вызова: .execution_options() создал бы копию statement'а без кэша ключа
+    started = time.perf_counter()
+    try:
+        return await conn.stream(statement.query, parameters, execution_options={"yield_per": batch_size})
+    finally:
+        db_statement_duration.record((time.perf_counter() - started) * 1000, statement_attributes(statement.name))
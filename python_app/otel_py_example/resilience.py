@@ -0,0 +1,433 @@
+"""
+Устойчивость к отказам зависимостей (Postgres, Redis, app2): circuit breaker, бюджет ретраев и дедлайн запроса.
+
+- Дедлайн задаётся на входе (X-Request-Timeout-Ms от вызывающего сервиса или request_timeout из настроек),
+  хранится в contextvar и ограничивает каждый вызов зависимости; в исходящие HTTP запросы уходит остаток.
+- Circuit breaker на зависимость: после breaker_failure_threshold сбоев подряд вызовы сразу падают
+  с CircuitOpenError (без ожидания таймаута), через breaker_recovery_timeout пропускается пробный вызов.
+- Бюджет ретраев как retry throttling в gRPC: сбой тратит токен, успех возвращает долю токена,
+  ретраи разрешены, пока токенов больше половины - при массовых сбоях ретраи не умножают нагрузку.
+
+Состояние breaker'ов экспортируется метрикой resilience.circuit.state, переходы и отказы - событиями в спане
+"""
+
+import asyncio
+import contextvars
+import functools
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from opentelemetry import metrics, trace
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from otel_py_example.settings import Settings
+
+T = TypeVar("T")
+
+meter = metrics.get_meter(__name__)
+
+rejected_counter = meter.create_counter(
+    "resilience.circuit.rejected", description="Calls rejected by an open circuit breaker"
+)
+transitions_counter = meter.create_counter(
+    "resilience.circuit.transitions", description="Circuit breaker state changes"
+)
+retries_counter = meter.create_counter("resilience.retries", description="Retried dependency calls")
+budget_exhausted_counter = meter.create_counter(
+    "resilience.retry_budget.exhausted", description="Retries skipped because the retry budget is exhausted"
+)
+deadline_counter = meter.create_counter(
+    "resilience.deadline.exceeded", description="Dependency calls cut by the request deadline"
+)
+
+DEADLINE_HEADER = "x-request-timeout-ms"
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Абсолютный дедлайн текущего запроса по time.monotonic()
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("request_deadline", default=None)
+# Все breaker'ы процесса - для метрики состояния
+_breakers: dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker '{name}' is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def remaining() -> float | None:
+    """
+    Секунд до дедлайна текущего запроса (None - дедлайна нет)
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def deadline_headers(headers: dict | None = None) -> dict:
+    left = remaining()
+    if left is None:
+        return headers or {}
+    return {**(headers or {}), DEADLINE_HEADER: str(max(int(left * 1000), 0))}
+
+
+def detached_context() -> contextvars.Context:
+    """
+    Копия текущего контекста без дедлайна запроса - для общей работы (single-flight, пачки запросов),
+    к которой присоединяются другие запросы: иначе все работали бы под дедлайном первого
+    """
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+async def wait_shared(future: Awaitable[T], name: str) -> T:
+    """
+    Ожидание общей задачи в пределах дедлайна своего запроса; сама задача продолжается для остальных
+    """
+    left = remaining()
+    try:
+        async with asyncio.timeout(left):
+            # shield: отмена одного ожидающего не отменяет работу для остальных
+            return await asyncio.shield(future)
+    except TimeoutError as e:
+        if left is None or remaining() > 0:
+            raise
+        deadline_counter.add(1, {"dependency": name})
+        raise DeadlineExceeded(f"Request deadline exceeded while waiting for shared '{name}'") from e
+
+
+@asynccontextmanager
+async def deadline_scope(timeout: float | None) -> AsyncIterator[None]:
+    """
+    Дедлайн для кода вне HTTP запроса (фоновые задачи, бенчмарки); вложенный не продлевает внешний
+    """
+    if timeout is None:
+        yield
+        return
+    deadline = time.monotonic() + timeout
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class DeadlineMiddleware:
+    """
+    Выставляет дедлайн запроса: из заголовка вызывающего сервиса или request_timeout по умолчанию
+    """
+
+    def __init__(self, app: ASGIApp, default_timeout: float = 0):
+        self.app = app
+        self.default_timeout = default_timeout
+        self._header_key = DEADLINE_HEADER.encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = self.default_timeout or None
+        for key, value in scope["headers"]:
+            if key == self._header_key:
+                try:
+                    incoming = int(value) / 1000
+                except ValueError:
+                    break
+                # 0 и отрицательные значения игнорируем: иначе любой клиент получает 504 без вызова зависимостей
+                if incoming <= 0:
+                    break
+                timeout = incoming if timeout is None else min(timeout, incoming)
+                break
+
+        async with deadline_scope(timeout):
+            await self.app(scope, receive, send)
+
+
+def add_span_event(name: str, attributes: dict) -> None:
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.add_event(name, attributes)
+
+
+class CircuitBreaker:
+    """
+    closed -> open после failure_threshold сбоев подряд, open -> half_open через recovery_timeout,
+    half_open -> closed после успешной пробы (или снова open при сбое). Один event loop - без локов
+    """
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.attributes = {"dependency": name}
+        _breakers[name] = self
+
+    def before_call(self) -> None:
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN:
+            left = self.opened_at + self.recovery_timeout - time.monotonic()
+            if left > 0:
+                self._reject(left)
+            self._transition(HALF_OPEN)
+        if self.probes >= self.half_open_max_calls:
+            self._reject(self.recovery_timeout)
+        self.probes += 1
+
+    def on_success(self) -> None:
+        self.failures = 0
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED)
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def release(self) -> None:
+        # Проба отменена (отмена запроса клиентом) - освобождаем место для следующей
+        if self.state == HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    def _reject(self, retry_after: float) -> None:
+        rejected_counter.add(1, self.attributes)
+        add_span_event("circuit_breaker.rejected", {"dependency": self.name, "state": self.state})
+        raise CircuitOpenError(self.name, retry_after)
+
+    def _transition(self, state: str) -> None:
+        previous, self.state = self.state, state
+        self.probes = 0
+        if state == CLOSED:
+            self.failures = 0
+        transitions_counter.add(1, {"dependency": self.name, "state": state})
+        add_span_event("circuit_breaker.state_change", {"dependency": self.name, "from": previous, "to": state})
+
+
+class RetryBudget:
+    """
+    Retry throttling как в gRPC: токены тратятся на сбоях и копятся на успехах
+    """
+
+    def __init__(self, max_tokens: float, token_ratio: float):
+        self.max_tokens = max_tokens
+        self.token_ratio = token_ratio
+        self.tokens = max_tokens
+
+    def on_success(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.token_ratio)
+
+    def on_failure(self) -> None:
+        self.tokens = max(0.0, self.tokens - 1)
+
+    def allow_retry(self) -> bool:
+        return self.tokens > self.max_tokens / 2
+
+
+class Policy:
+    """
+    Breaker + бюджет ретраев + дедлайн для одной зависимости.
+
+    failures - исключения, которые считаются отказом зависимости (соединение, таймаут);
+    остальные (ошибки запроса, нарушение constraint'ов) пробрасываются без учёта в breaker'е
+    """
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        budget: RetryBudget,
+        failures: tuple[type[BaseException], ...],
+        retries: int = 0,
+        backoff_base: float = 0.05,
+        backoff_max: float = 1.0,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.budget = budget
+        self.failures = (*failures, TimeoutError)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.attributes = {"dependency": name}
+
+    def on_success(self) -> None:
+        self.breaker.on_success()
+        self.budget.on_success()
+
+    def on_failure(self) -> None:
+        self.breaker.on_failure()
+        self.budget.on_failure()
+
+    def timeout(self) -> float | None:
+        left = remaining()
+        if left is not None and left <= 0:
+            raise self.deadline_exceeded("before calling")
+        return left
+
+    def deadline_exceeded(self, when: str) -> DeadlineExceeded:
+        deadline_counter.add(1, self.attributes)
+        return DeadlineExceeded(f"Request deadline exceeded {when} '{self.name}'")
+
+    def deadline_expired(self) -> DeadlineExceeded:
+        # Истёк дедлайн самого запроса (его задаёт и вызывающий через заголовок) - это не отказ зависимости:
+        # в breaker и бюджет ретраев не считаем, только освобождаем пробу half-open
+        self.breaker.release()
+        return self.deadline_exceeded("while calling")
+
+    def next_pause(self, attempt: int, retries: int, error: str) -> float | None:
+        """
+        Пауза перед ретраем; None - ретраи, бюджет или время до дедлайна закончились
+        """
+        if attempt >= retries:
+            return None
+        if not self.budget.allow_retry():
+            budget_exhausted_counter.add(1, self.attributes)
+            return None
+        # Full jitter: случайная пауза от 0 до экспоненциального предела, но не дольше дедлайна
+        pause = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt + 1)))
+        left = remaining()
+        if left is not None and pause >= left:
+            return None
+        retries_counter.add(1, self.attributes)
+        add_span_event("retry", {"dependency": self.name, "attempt": attempt + 1, "error": error})
+        return pause
+
+    async def call(self, fn: Callable[[], Awaitable[T]], retry: bool = True) -> T:
+        attempt = 0
+        while True:
+            timeout = self.timeout()
+            self.breaker.before_call()
+            try:
+                async with asyncio.timeout(timeout) as deadline:
+                    result = await fn()
+            except self.failures as e:
+                if deadline.expired():
+                    raise self.deadline_expired() from e
+                self.on_failure()
+                pause = self.next_pause(attempt, self.retries if retry else 0, type(e).__name__)
+                if pause is None:
+                    raise
+                await asyncio.sleep(pause)
+                attempt += 1
+                continue
+            except Exception:
+                # Зависимость ответила, ошибка в самом запросе - для breaker'а это успех
+                self.on_success()
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.on_success()
+            return result
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """
+        Breaker без ретраев и таймаута - для потоковой выдачи, которую нельзя повторить с середины
+        """
+        self.timeout()
+        self.breaker.before_call()
+        try:
+            yield
+        except self.failures:
+            self.on_failure()
+            raise
+        except Exception:
+            self.on_success()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.on_success()
+
+
+def resilient(retry: bool = True):
+    """
+    Декоратор async метода репозитория: вызов через self.policy (если он задан)
+    """
+
+    def decorator(method: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs) -> T:
+            if self.policy is None:
+                return await method(self, *args, **kwargs)
+            return await self.policy.call(lambda: method(self, *args, **kwargs), retry=retry)
+
+        return wrapper
+
+    return decorator
+
+
+def resilient_stream(method: Callable[..., AsyncIterator[T]]) -> Callable[..., AsyncIterator[T]]:
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs) -> AsyncIterator[T]:
+        if self.policy is None:
+            async for item in method(self, *args, **kwargs):
+                yield item
+            return
+        async with self.policy.guard():
+            async for item in method(self, *args, **kwargs):
+                yield item
+
+    return wrapper
+
+
+def build_policy(name: str, settings: Settings, failures: tuple[type[BaseException], ...], retries: int = 0) -> Policy:
+    return Policy(
+        name,
+        CircuitBreaker(
+            name,
+            failure_threshold=settings.breaker_failure_threshold,
+            recovery_timeout=settings.breaker_recovery_timeout,
+            half_open_max_calls=settings.breaker_half_open_max_calls,
+        ),
+        RetryBudget(settings.retry_budget_max_tokens, settings.retry_budget_token_ratio),
+        failures,
+        retries=retries,
+        backoff_base=settings.http_backoff_base,
+        backoff_max=settings.http_backoff_max,
+    )
+
+
+def observe_breakers(options) -> list[metrics.Observation]:
+    return [metrics.Observation(STATE_VALUES[breaker.state], breaker.attributes) for breaker in _breakers.values()]
+
+
+meter.create_observable_gauge(
+    "resilience.circuit.state",
+    callbacks=[observe_breakers],
+    description="Circuit breaker state: 0 closed, 1 half-open, 2 open",
+)
+
+
+async def circuit_open_handler(request: Request, exc: CircuitOpenError) -> JSONResponse:
+    return JSONResponse(
+        {"detail": f"Dependency '{exc.name}' is unavailable"},
+        status_code=503,
+        headers={"Retry-After": str(max(1, int(exc.retry_after + 0.999)))},
+    )
+
+
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded) -> JSONResponse:
+    return JSONResponse({"detail": str(exc)}, status_code=504)
@@ -1,41 +1,63 @@
+import asyncio
 import logging
 
-from sqlalchemy import create_engine as create_sync_engine
+import asyncpg
+from sqlalchemy import exc as sa_exc
 from sqlalchemy.ext import asyncio as sa
 
-from otel_py_example.settings import Settings, settings
+from otel_py_example.metrics import init_asyncpg_connection, instrument_sqlalchemy_engine
+from otel_py_example.settings import Settings
 
 logger = logging.getLogger(__name__)
 
+# Отказ самой базы (соединение, пул, сеть) - учитывается circuit breaker'ом, в отличие от ошибок запроса
+DATABASE_FAILURES = (
+    sa_exc.OperationalError,
+    sa_exc.InterfaceError,
+    sa_exc.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    OSError,
+)
+
 
 def create_sa_engine(settings: Settings) -> sa.AsyncEngine:
     logger.info("Initializing SQLAlchemy async engine")
-    return sa.create_async_engine(
+    engine = sa.create_async_engine(
         url=settings.db_dsn,
-        echo=settings.debug,
-        echo_pool=settings.debug,
+        echo=settings.database_echo,
+        echo_pool=settings.database_echo_pool,
         pool_size=settings.database_pool_size,
         pool_pre_ping=settings.database_pool_pre_ping,
         max_overflow=settings.database_max_overflow,
+        query_cache_size=settings.database_query_cache_size,
+        connect_args={"prepared_statement_cache_size": settings.database_prepared_statement_cache_size},
     )
+    instrument_sqlalchemy_engine(engine)
+    return engine
 
 
-def create_sync_sa_engine(settings: Settings):
-    logger.info("Initializing SQLAlchemy sync engine")
-    # Convert async URL to sync URL for instrumentation
-    sync_dsn = settings.db_dsn.set(drivername="postgresql+psycopg2")
-    return create_sync_engine(
-        url=sync_dsn,
-        echo=settings.debug,
-        echo_pool=settings.debug,
-        pool_size=settings.database_pool_size,
-        pool_pre_ping=settings.database_pool_pre_ping,
-        max_overflow=settings.database_max_overflow,
+async def create_asyncpg_pool(settings: Settings) -> asyncpg.Pool:
+    logger.info("Initializing asyncpg connection pool")
+    return await asyncpg.create_pool(
+        dsn=settings.asyncpg_dsn,
+        min_size=settings.asyncpg_pool_min_size,
+        max_size=settings.asyncpg_pool_max_size,
+        statement_cache_size=settings.asyncpg_statement_cache_size,
+        max_cached_statement_lifetime=settings.asyncpg_max_cached_statement_lifetime,
+        max_inactive_connection_lifetime=settings.asyncpg_max_inactive_connection_lifetime,
+        command_timeout=settings.asyncpg_command_timeout,
+        init=init_asyncpg_connection,
     )
 
 
-database_engine = create_sa_engine(settings)
-sync_database_engine = create_sync_sa_engine(settings)
+async def close_asyncpg_pool(pool: asyncpg.Pool, timeout: float) -> None:
+    logger.info("Closing asyncpg connection pool")
+    try:
+        await asyncio.wait_for(pool.close(), timeout=timeout)
+    except TimeoutError:
+        logger.warning("asyncpg pool did not close in %ss, terminating connections", timeout)
+        pool.terminate()
 
 
 async def create_session(engine: sa.AsyncEngine) -> sa.AsyncSession:
@@ -0,0 +1,20 @@
+import logging
+
+import httpx
+
+from otel_py_example.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    logger.info("Initializing shared httpx client")
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+        # HTTP/2 требует пакет h2 (httpx[http2])
+        http2=settings.http2,
+    )
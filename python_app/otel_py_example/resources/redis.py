@@ -0,0 +1,55 @@
+import logging
+import time
+
+from redis import asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError, RedisError, TimeoutError as RedisTimeoutError
+
+from otel_py_example.metrics import redis_attributes, redis_duration
+from otel_py_example.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_FAILURES = (RedisConnectionError, RedisTimeoutError, OSError)
+
+
+class RedisPoolExhaustedError(RedisError):
+    """
+    Все соединения пула заняты дольше redis_pool_timeout: перегрузка у нас, а не отказ Redis -
+    в REDIS_FAILURES не входит и breaker не открывает
+    """
+
+
+class BlockingPool(aioredis.BlockingConnectionPool):
+    """
+    При исчерпании ждёт свободное соединение, а не падает сразу с "Too many connections"
+    """
+
+    async def get_connection(self, *args, **kwargs):
+        try:
+            return await super().get_connection(*args, **kwargs)
+        except RedisConnectionError as e:
+            # Ожидание соединения пула redis-py заворачивает в ConnectionError поверх TimeoutError
+            if isinstance(e.__cause__, TimeoutError):
+                raise RedisPoolExhaustedError(f"No Redis connection available in {self.timeout}s") from e
+            raise
+
+
+class TimedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            redis_duration.record((time.perf_counter() - started) * 1000, redis_attributes(str(args[0])))
+
+
+def create_redis_client(settings: Settings, decode_responses: bool = True) -> aioredis.Redis:
+    logger.info("Initializing redis client")
+    pool = BlockingPool.from_url(
+        f"redis://{settings.redis_host}:{settings.redis_port}",
+        decode_responses=decode_responses,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout,
+    )
+    # from_pool: клиент закрывает пул вместе с собой
+    return TimedRedis.from_pool(pool)
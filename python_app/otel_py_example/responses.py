@@ -0,0 +1,60 @@
+"""
+Быстрый JSON ответ: строки (EntityRow) кодируются сразу в bytes, без jsonable_encoder и промежуточных dict.
+
+Библиотека выбирается настройкой json_library: orjson или msgspec (отдельные пакеты, в зависимости
+проекта не входят), при auto - первая установленная, иначе stdlib json
+"""
+
+import json
+from typing import Any, Callable, Iterable
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from otel_py_example.settings import settings
+
+
+def _default(obj: Any) -> Any:
+    # Для stdlib json и типов, которые библиотека не знает (pydantic модели и т.п.)
+    if hasattr(obj, "__slots__") and hasattr(obj, "__dataclass_fields__"):
+        return {name: getattr(obj, name) for name in obj.__dataclass_fields__}
+    return jsonable_encoder(obj)
+
+
+def load_encoder(library: str) -> tuple[str, Callable[[Any], bytes]]:
+    if library in ("auto", "orjson"):
+        try:
+            import orjson
+        except ImportError:
+            if library == "orjson":
+                raise
+        else:
+            return "orjson", lambda obj: orjson.dumps(obj, default=_default)
+
+    if library in ("auto", "msgspec"):
+        try:
+            import msgspec
+        except ImportError:
+            if library == "msgspec":
+                raise
+        else:
+            return "msgspec", msgspec.json.Encoder(enc_hook=_default).encode
+
+    if library in ("auto", "json"):
+        return "json", lambda obj: json.dumps(
+            obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+        ).encode("utf-8")
+
+    raise ValueError(f"Unknown JSON library: {library}")
+
+
+ENCODER_NAME, json_dumps = load_encoder(settings.json_library)
+
+
+def json_lines(items: Iterable[Any]) -> bytes:
+    return b"".join(json_dumps(item) + b"\n" for item in items)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
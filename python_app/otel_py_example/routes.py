@@ -0,0 +1,256 @@
+"""
+Роуты приложения. Подключаются в create_app()
+"""
+
+import asyncio
+import os
+import random
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from otel_py_example.bulk import read_entity_items
+from otel_py_example.clients import FetchCoalescer, ServiceClient, call_error, update_data_service_2
+from otel_py_example.container import (
+    get_chain_client,
+    get_entities_handler,
+    get_entities_handler_asyncpg,
+    get_executors,
+    get_redis_repo,
+    get_second_app_client,
+    get_second_app_coalescer,
+)
+from otel_py_example.executors import Executors
+from otel_py_example.handlers import EntitiesHandler, EntitiesHandlerAsyncpg
+from otel_py_example.middleware import get_trace_id_from_request
+from otel_py_example.propagation import inject_trace_headers, request_trace_id
+from otel_py_example.repository.redis_repo import RedisRepo
+from otel_py_example.responses import FastJSONResponse, json_lines
+from otel_py_example.schemas import EntityCreateModel, SecondAppPayload
+from otel_py_example.settings import settings
+from otel_py_example.tasks import blocking_io, cpu_bound
+
+router = APIRouter()
+
+TARGET_ONE_HOST = os.environ.get("TARGET_ONE_HOST", "app-b")
+TARGET_TWO_HOST = os.environ.get("TARGET_TWO_HOST", "app-c")
+
+
+@router.get("/")
+def root_endpoint(request: Request):
+    # Получаем trace_id из фронтенда
+    frontend_trace_id = get_trace_id_from_request(request)
+    current_trace_id = request_trace_id(request)
+
+    logger.info(f"Root endpoint called - Frontend trace_id: {frontend_trace_id}, Backend trace_id: {current_trace_id}")
+
+    return {
+        "message": "Hello World",
+        "trace_info": {"frontend_trace_id": frontend_trace_id, "backend_trace_id": current_trace_id},
+    }
+
+
+@router.get("/items/{item_id}")
+async def read_item(item_id: int, q: Optional[str] = None):
+    logger.debug("items")
+    return {"item_id": item_id, "q": q}
+
+
+@router.get("/io_task")
+async def io_task(executors: Executors = Depends(get_executors)):
+    # time.sleep в пуле потоков не блокирует event loop
+    result = await executors.run_blocking(blocking_io, 1)
+    logger.debug("io task")
+    return result
+
+
+@router.get("/cpu_task")
+async def cpu_task(executors: Executors = Depends(get_executors)):
+    result = await executors.run_cpu(cpu_bound, 1000)
+    logger.debug("cpu task")
+    return result
+
+
+@router.get("/random_status")
+async def random_status(response: Response):
+    status_code = random.choice([200, 300, 400, 500])
+    response.status_code = status_code
+    logger.info(f"Random status code: {status_code}")
+    {"path": "/random_status"}
+
+
+@router.get("/random_sleep")
+async def random_sleep(response: Response):
+    sleep_duration = random.uniform(0, 5)
+    await asyncio.sleep(sleep_duration)
+    logger.info(f"random sleep time: {sleep_duration}")
+    return {"path": "/random_sleep"}
+
+
+@router.get("/error_test")
+async def error_test(response: Response):
+    logger.error("got error!!!!")
+    raise ValueError("value error")
+
+
+@router.get("/chain")
+async def chain(response: Response, client: ServiceClient = Depends(get_chain_client)):
+    headers = inject_trace_headers({})  # inject trace info to header
+    logger.debug(f"Chain traceparent: {headers.get('traceparent')}")
+
+    await client.get("/", headers=headers)
+    # async with httpx.AsyncClient() as client:
+    #     await client.get(
+    #         f"http://{TARGET_ONE_HOST}:8000/io_task",
+    #         headers=headers,
+    #     )
+    # async with httpx.AsyncClient() as client:
+    #     await client.get(
+    #         f"http://{TARGET_TWO_HOST}:8000/cpu_task",
+    #         headers=headers,
+    #     )
+    logger.info("Chain Finished")
+    return {"path": "/chain"}
+
+
+async def ndjson_stream(batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    # Одна пачка строк из курсора - один chunk ответа
+    async for batch in batches:
+        yield json_lines(batch)
+
+
+# Списки отдаются FastJSONResponse напрямую: без валидации response_model и jsonable_encoder
+@router.get("/entities/", response_class=FastJSONResponse)
+async def get_all_entities(
+    request: Request,
+    limit: int = Query(settings.entities_page_size, ge=1, le=settings.entities_max_page_size),
+    after: int = Query(0, ge=0),
+    stream: bool = False,
+    handler: EntitiesHandler = Depends(get_entities_handler),
+):
+    # Получаем trace_id из фронтенда
+    frontend_trace_id = get_trace_id_from_request(request)
+    current_trace_id = request_trace_id(request)
+
+    logger.info(f"Getting all entities - Frontend trace_id: {frontend_trace_id}, Backend trace_id: {current_trace_id}")
+
+    if stream:
+        batches = handler.stream_entities(settings.entities_stream_batch_size, after)
+        return StreamingResponse(ndjson_stream(batches), media_type="application/x-ndjson")
+
+    entities, next_after = await handler.get_entities_page(limit, after)
+    return FastJSONResponse(
+        {
+            "entities": entities,
+            "next_after": next_after,
+            "trace_info": {"frontend_trace_id": frontend_trace_id, "backend_trace_id": current_trace_id},
+        }
+    )
+
+
+@router.get("/entities/{entity_id}/")
+async def get_entity_by_id(entity_id: str, handler: EntitiesHandler = Depends(get_entities_handler)):
+    entity = await handler.get_entity_by_id(entity_id)
+    return {"entity": entity}
+
+
+@router.post("/entities/")
+async def create_entity(
+    income: EntityCreateModel, request: Request, handler: EntitiesHandler = Depends(get_entities_handler)
+):
+    # Получаем trace_id из фронтенда
+    frontend_trace_id = get_trace_id_from_request(request)
+    current_trace_id = request_trace_id(request)
+
+    logger.info(
+        f"Creating entity '{income.name}' - Frontend trace_id: {frontend_trace_id}, Backend trace_id: {current_trace_id}"
+    )
+
+    res = await handler.create_entity(income.name, income.description)
+    return {"entity": res, "trace_info": {"frontend_trace_id": frontend_trace_id, "backend_trace_id": current_trace_id}}
+
+
+@router.post("/entities/bulk/")
+async def bulk_create_entities(
+    request: Request,
+    batch_size: int = Query(settings.entities_bulk_batch_size, ge=1, le=settings.entities_bulk_max_batch_size),
+    handler: EntitiesHandler = Depends(get_entities_handler),
+):
+    # Принимает JSON-массив или NDJSON поток (Content-Type: application/x-ndjson)
+    return await handler.bulk_create(read_entity_items(request), batch_size)
+
+
+@router.get("/entities-asyncpg/", response_class=FastJSONResponse)
+async def get_all_entities(
+    limit: int = Query(settings.entities_page_size, ge=1, le=settings.entities_max_page_size),
+    after: int = Query(0, ge=0),
+    stream: bool = False,
+    handler: EntitiesHandlerAsyncpg = Depends(get_entities_handler_asyncpg),
+):
+    if stream:
+        batches = handler.stream_entities(settings.entities_stream_batch_size, after)
+        return StreamingResponse(ndjson_stream(batches), media_type="application/x-ndjson")
+
+    entities, next_after = await handler.get_entities_page(limit, after)
+    return FastJSONResponse({"entities": entities, "next_after": next_after})
+
+
+@router.get("/entities-asyncpg/{entity_id}/")
+async def get_entity_by_id(entity_id: str, handler: EntitiesHandlerAsyncpg = Depends(get_entities_handler_asyncpg)):
+    entity = await handler.get_entity_by_id(entity_id)
+    return {"entity": entity}
+
+
+@router.post("/entities-asyncpg/")
+async def create_entity(
+    name: str, description: str, handler: EntitiesHandlerAsyncpg = Depends(get_entities_handler_asyncpg)
+):
+    res = await handler.create_entity(name, description)
+    return {"entity": res}
+
+
+@router.post("/entities-asyncpg/bulk/")
+async def bulk_create_entities(
+    request: Request,
+    batch_size: int = Query(settings.entities_bulk_batch_size, ge=1, le=settings.entities_bulk_max_batch_size),
+    handler: EntitiesHandlerAsyncpg = Depends(get_entities_handler_asyncpg),
+):
+    return await handler.bulk_create(read_entity_items(request), batch_size)
+
+
+@router.get("/redis-get/")
+async def get_redis_value(handler: RedisRepo = Depends(get_redis_repo)):
+    entity = await handler.get_value()
+    return {"entity": entity}
+
+
+@router.post("/redis-set/")
+async def set_redis_value(value: str, handler: RedisRepo = Depends(get_redis_repo)):
+    res = await handler.set_val(value)
+    return {"res": res}
+
+
+@router.post("/redis-delete/")
+async def delete_redis_value(handler: RedisRepo = Depends(get_redis_repo)):
+    res = await handler.delete_value()
+    return {"res": res}
+
+
+@router.get("/second-app/")
+async def fetch_second_app(entity_id: int, coalescer: FetchCoalescer = Depends(get_second_app_coalescer)):
+    res = await coalescer.fetch(entity_id)
+    return {"res": res}
+
+
+@router.post("/second-app/")
+async def update_second_app(income: SecondAppPayload, client: ServiceClient = Depends(get_second_app_client)):
+    res = await update_data_service_2(client, income.entity_id, income.value)
+    return {"res": res}
+
+
+@router.post("/second-app/error/")
+async def call_error_second_app(client: ServiceClient = Depends(get_second_app_client)):
+    res = await call_error(client)
+    return {"res": res}
@@ -0,0 +1,229 @@
+"""
+Head sampling (доля, parent-based, правила по роутам, лимит новых трейсов в секунду)
+и in-process tail sampling (оставляем медленные и ошибочные трейсы)
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.sdk.trace.sampling import (
+    Decision,
+    ParentBased,
+    Sampler,
+    SamplingResult,
+    TraceIdRatioBased,
+)
+from opentelemetry.trace import Link, SpanKind, StatusCode, get_current_span
+from opentelemetry.trace.span import TraceState
+from opentelemetry.util.types import Attributes
+
+from otel_py_example.settings import Settings
+
+
+class RouteRuleSampler(Sampler):
+    """
+    Доля семплирования по пути запроса: точное совпадение или префикс с "*" на конце
+    """
+
+    def __init__(self, rules: dict[str, float], default: Sampler):
+        self.default = default
+        self.exact = {route: TraceIdRatioBased(ratio) for route, ratio in rules.items() if not route.endswith("*")}
+        self.prefixes = sorted(
+            ((route[:-1], TraceIdRatioBased(ratio)) for route, ratio in rules.items() if route.endswith("*")),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+
+    def should_sample(
+        self,
+        parent_context: Optional[Context],
+        trace_id: int,
+        name: str,
+        kind: Optional[SpanKind] = None,
+        attributes: Attributes = None,
+        links: Optional[Sequence[Link]] = None,
+        trace_state: Optional[TraceState] = None,
+    ) -> SamplingResult:
+        sampler = self._match(name, attributes) or self.default
+        return sampler.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+
+    def _match(self, name: str, attributes: Attributes) -> Sampler | None:
+        candidates = []
+        if attributes:
+            path = attributes.get("url.path") or attributes.get("http.target")
+            if path:
+                candidates.append(str(path).split("?", 1)[0])
+        # Имя серверного спана FastAPI - "GET /items/{item_id}", правило может быть задано по шаблону роута
+        _, _, route = name.partition(" ")
+        if route:
+            candidates.append(route)
+
+        for candidate in candidates:
+            if candidate in self.exact:
+                return self.exact[candidate]
+        for candidate in candidates:
+            for prefix, sampler in self.prefixes:
+                if candidate.startswith(prefix):
+                    return sampler
+        return None
+
+    def get_description(self) -> str:
+        return f"RouteRuleSampler{{default={self.default.get_description()}}}"
+
+
+class RateLimitingSampler(Sampler):
+    """
+    Пропускает не больше traces_per_second выбранных делегатом трейсов (token bucket).
+    Под ParentBased решение принимается только для корневых спанов, дочерние наследуют его -
+    лимит на новые трейсы, а не на спаны (их в трейсе сколько угодно)
+    """
+
+    def __init__(self, delegate: Sampler, traces_per_second: float):
+        self.delegate = delegate
+        self.traces_per_second = traces_per_second
+        self._tokens = traces_per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def should_sample(
+        self,
+        parent_context: Optional[Context],
+        trace_id: int,
+        name: str,
+        kind: Optional[SpanKind] = None,
+        attributes: Attributes = None,
+        links: Optional[Sequence[Link]] = None,
+        trace_state: Optional[TraceState] = None,
+    ) -> SamplingResult:
+        result = self.delegate.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+        if result.decision != Decision.RECORD_AND_SAMPLE or self._take():
+            return result
+        return SamplingResult(Decision.DROP, None, _parent_trace_state(parent_context))
+
+    def _take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.traces_per_second, self._tokens + (now - self._last) * self.traces_per_second)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def get_description(self) -> str:
+        return f"RateLimitingSampler{{{self.traces_per_second}/s, {self.delegate.get_description()}}}"
+
+
+def _parent_trace_state(parent_context: Optional[Context]) -> Optional[TraceState]:
+    return get_current_span(parent_context).get_span_context().trace_state
+
+
+def build_sampler(settings: Settings) -> Sampler:
+    sampler: Sampler = TraceIdRatioBased(settings.sampling_ratio)
+    if settings.sampling_route_ratios:
+        sampler = RouteRuleSampler(settings.sampling_route_ratios, sampler)
+    if settings.sampling_traces_per_second > 0:
+        sampler = RateLimitingSampler(sampler, settings.sampling_traces_per_second)
+    if settings.sampling_parent_based:
+        # Решение вышестоящего сервиса (флаг sampled в traceparent) уважаем, правила - только для корневых спанов
+        sampler = ParentBased(root=sampler)
+    return sampler
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """
+    Держит спаны трейса в памяти до завершения локального корневого спана и передаёт их дальше
+    (в BatchSpanProcessor) только если трейс медленный, с ошибкой или попал в keep_ratio
+    """
+
+    def __init__(
+        self,
+        delegate: SpanProcessor,
+        latency_threshold_ms: float = 500.0,
+        keep_ratio: float = 0.0,
+        decision_wait: float = 5.0,
+        max_traces: int = 10_000,
+    ):
+        self.delegate = delegate
+        self.latency_threshold_ns = latency_threshold_ms * 1_000_000
+        self.keep_ratio = keep_ratio
+        self.decision_wait = decision_wait
+        self.max_traces = max_traces
+
+        # trace_id -> (время первого спана, спаны)
+        self._traces: OrderedDict[int, tuple[float, list[ReadableSpan]]] = OrderedDict()
+        # Решения по уже закрытым трейсам - для спанов, завершившихся после корневого
+        self._decisions: OrderedDict[int, bool] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None) -> None:
+        self.delegate.on_start(span, parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        to_export: list[ReadableSpan] = []
+        with self._lock:
+            decision = self._decisions.get(trace_id)
+            if decision is not None:
+                to_export = [span] if decision else []
+            else:
+                _, spans = self._traces.setdefault(trace_id, (time.monotonic(), []))
+                spans.append(span)
+                if span.parent is None or span.parent.is_remote:
+                    to_export = self._decide(trace_id, root=span)
+                to_export += self._evict_expired()
+
+        for one_span in to_export:
+            self.delegate.on_end(one_span)
+
+    def _decide(self, trace_id: int, root: ReadableSpan | None = None) -> list[ReadableSpan]:
+        _, spans = self._traces.pop(trace_id)
+        keep = (
+            any(one_span.status.status_code == StatusCode.ERROR for one_span in spans)
+            or (root is not None and root.end_time - root.start_time >= self.latency_threshold_ns)
+            or random.random() < self.keep_ratio
+        )
+        self._decisions[trace_id] = keep
+        while len(self._decisions) > self.max_traces:
+            self._decisions.popitem(last=False)
+        return spans if keep else []
+
+    def _evict_expired(self) -> list[ReadableSpan]:
+        # Трейсы без локального корня (или с зависшим корнем) решаем по тому, что успело накопиться
+        to_export = []
+        deadline = time.monotonic() - self.decision_wait
+        while self._traces:
+            trace_id, (first_seen, _) = next(iter(self._traces.items()))
+            if first_seen > deadline and len(self._traces) <= self.max_traces:
+                break
+            to_export += self._decide(trace_id)
+        return to_export
+
+    def shutdown(self) -> None:
+        with self._lock:
+            to_export = []
+            while self._traces:
+                to_export += self._decide(next(iter(self._traces)))
+        for span in to_export:
+            self.delegate.on_end(span)
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+def wrap_processor(processor: SpanProcessor, settings: Settings) -> SpanProcessor:
+    if not settings.tail_sampling_enabled:
+        return processor
+    return TailSamplingSpanProcessor(
+        processor,
+        latency_threshold_ms=settings.tail_sampling_latency_ms,
+        keep_ratio=settings.tail_sampling_keep_ratio,
+        decision_wait=settings.tail_sampling_decision_wait,
+        max_traces=settings.tail_sampling_max_traces,
+    )
@@ -0,0 +1,11 @@
+import pydantic
+
+
+class EntityCreateModel(pydantic.BaseModel):
+    name: str
+    description: str
+
+
+class SecondAppPayload(pydantic.BaseModel):
+    entity_id: str
+    value: str
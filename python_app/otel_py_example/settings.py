@@ -1,16 +1,30 @@
+import os
+from typing import TYPE_CHECKING
+
 from pydantic_settings import BaseSettings
-from sqlalchemy.engine.url import URL
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine.url import URL
 
 
 class Settings(BaseSettings):
     debug: bool = True
 
+    expose_port: int = 8000
+    # Каждый воркер - отдельный процесс со своими пулами БД (database_pool_size + database_max_overflow
+    # + asyncpg_pool_max_size соединений) и пулом процессов: workers x соединения не больше max_connections Postgres
+    workers: int = 1  # 0 - по числу CPU
+    server_uvloop: bool = False  # нужен пакет uvloop
+    server_httptools: bool = False  # нужен пакет httptools
+    server_graceful_shutdown_timeout: float = 30.0
+
     db_driver: str = "postgresql+asyncpg"
     postgres_user: str = "opg_user"
     postgres_password: str = "opg_password"
     postgres_host: str = "db"  # Changed from localhost to db for container
     postgres_port: int = 5432
     postgres_database: str = "opg_db"
+    postgres_max_connections: int = 100  # max_connections сервера, launcher предупреждает о превышении
 
     database_dsn: str = (
         f"{db_driver}://{postgres_user}:{postgres_password}@{postgres_host}:{postgres_port}/{postgres_database}"
@@ -18,15 +32,166 @@ class Settings(BaseSettings):
     database_pool_size: int = 5
     database_max_overflow: int = 10
     database_pool_pre_ping: bool = True
-    database_max_reties_count: int = 5
+    database_max_reties_count: int = 5  # ретраи чтений при сбое соединения (в пределах бюджета ретраев)
+    # Логирование SQL и пула - только для отладки, в проде выключено
+    database_echo: bool = False
+    database_echo_pool: bool = False
+    # Кэш скомпилированных запросов SQLAlchemy и prepared statements asyncpg на соединение движка
+    database_query_cache_size: int = 500
+    database_prepared_statement_cache_size: int = 100
+    # sqlcommenter дописывает traceparent в текст запроса: каждый запрос уникален и не попадает
+    # в кэш prepared statements asyncpg
+    database_sql_commenter: bool = False
+
+    asyncpg_pool_min_size: int = 2
+    asyncpg_pool_max_size: int = 10
+    asyncpg_statement_cache_size: int = 100
+    asyncpg_max_cached_statement_lifetime: int = 300
+    asyncpg_max_inactive_connection_lifetime: float = 300.0
+    asyncpg_command_timeout: float = 30.0
+    asyncpg_pool_close_timeout: float = 10.0
+
+    otlp_protocol: str = "grpc"  # grpc | http/protobuf
+    otlp_compression: str = "none"  # none | gzip
+    otlp_max_queue_size: int = 2048
+    otlp_max_export_batch_size: int = 512
+    otlp_schedule_delay_millis: int = 5000
+    otlp_export_timeout_millis: int = 30000
+    # Дополнительные бэкенды, у каждого своя очередь. Env: OTLP_EXTRA_ENDPOINTS='["http://tempo:4317"]'
+    otlp_extra_endpoints: list[str] = []
+    # Спул на диск, пока коллектор недоступен: батчи не теряются и не копятся в памяти.
+    # Чтобы спаны переживали и рестарт контейнера, каталог нужно вынести в volume
+    otlp_spool_enabled: bool = False
+    otlp_spool_dir: str = "/tmp/otel-spool"
+    otlp_spool_max_bytes: int = 256 * 1024 * 1024
+    otlp_spool_segment_bytes: int = 8 * 1024 * 1024
+    otlp_spool_replay_rate: float = 5000  # спанов в секунду при досылке, 0 - без ограничения
+    otlp_spool_retry_interval: float = 5.0  # секунд после сбоя экспорт идёт сразу на диск
+    otlp_spool_slow_export_millis: int = 0  # экспорт дольше - тоже переключаемся на диск, 0 - выключено
+    otlp_spool_export_timeout_millis: int = 2000  # потолок таймаута прямого экспорта при включённом спуле
+
+    metrics_export_interval_millis: int = 15000
+
+    log_level: str = "INFO"
+    log_json: bool = True
+    # Запись в stderr из отдельного потока (loguru enqueue), а не из event loop
+    log_enqueue: bool = True
+    # Доля сохраняемых записей по уровням, например {"DEBUG": 0.01, "INFO": 0.5}; остальные уровни - все
+    log_sample_ratios: dict[str, float] = {}
+    # Записей в секунду на уровень (token bucket), 0 - без ограничения
+    log_rate_limit: float = 0
+    log_otlp_enabled: bool = False
+    log_otlp_level: str = "INFO"
+
+    sampling_ratio: float = 1.0
+    sampling_parent_based: bool = True
+    # Доля по пути/шаблону роута, "*" на конце - префикс. Env: SAMPLING_ROUTE_RATIOS='{"/error_test": 1, "/": 0.01}'
+    sampling_route_ratios: dict[str, float] = {}
+    # Новых трейсов в секунду (при sampling_parent_based; без него - каждого спана), 0 - без ограничения
+    sampling_traces_per_second: float = 0
+
+    # Tail sampling видит только спаны, прошедшие head sampling
+    tail_sampling_enabled: bool = False
+    tail_sampling_latency_ms: float = 500.0
+    tail_sampling_keep_ratio: float = 0.0  # доля быстрых успешных трейсов, которые всё равно экспортируются
+    tail_sampling_decision_wait: float = 5.0
+    tail_sampling_max_traces: int = 10_000
+
+    # Адаптивный лимит одновременных запросов на роут (AIMD по латентности), сверх лимита - сразу 503 с Retry-After
+    admission_enabled: bool = True
+    admission_initial_limit: int = 50
+    admission_min_limit: int = 4
+    admission_max_limit: int = 1000
+    # Потолок лимита по шаблону роута, например под пул БД (database_pool_size + database_max_overflow).
+    # Env: ADMISSION_ROUTE_LIMITS='{"/entities/": 15}'
+    admission_route_limits: dict[str, int] = {}
+    admission_excluded_routes: list[str] = []
+    admission_latency_tolerance: float = 2.0  # короткая средняя латентность выше базовой во столько раз - уменьшаем
+    admission_backoff_ratio: float = 0.9
+
+    # Дедлайн запроса по умолчанию (секунды), 0 - без дедлайна. Входящий X-Request-Timeout-Ms может только сократить
+    request_timeout: float = 30.0
+    # Circuit breaker на зависимость (postgres, redis, second_app, chain)
+    breaker_failure_threshold: int = 5  # сбоев подряд до размыкания
+    breaker_recovery_timeout: float = 10.0  # секунд до пробного вызова
+    breaker_half_open_max_calls: int = 1
+    # Бюджет ретраев (retry throttling как в gRPC): ретраи разрешены, пока токенов больше половины max
+    retry_budget_max_tokens: float = 10
+    retry_budget_token_ratio: float = 0.1  # сколько токена возвращает успешный вызов
 
     redis_host: str = "redis"
     redis_port: int = 6379
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 5.0  # ожидание свободного соединения пула, дольше - RedisPoolExhaustedError
+    redis_max_retries: int = 1
+
+    # Реализация репозитория за /entities/ (по результатам python -m benchmarks.repositories)
+    entities_backend: str = "sqlalchemy"  # sqlalchemy | asyncpg
+
+    entities_cache_enabled: bool = True
+    entities_cache_prefix: str = "entities"
+    entities_cache_ttl: int = 60
+    entities_cache_negative_ttl: int = 5
+    entities_cache_serializer: str = "json"  # json | pickle
+
+    # JSON списков сущностей: auto | orjson | msgspec | json (orjson и msgspec - отдельные пакеты)
+    json_library: str = "auto"
+
+    entities_page_size: int = 100
+    entities_max_page_size: int = 1000
+    entities_stream_batch_size: int = 1000
+    entities_bulk_batch_size: int = 1000
+    entities_bulk_max_batch_size: int = 10_000
+
+    local_cache_enabled: bool = True
+    local_cache_max_items: int = 10_000
+    local_cache_max_bytes: int = 16 * 1024 * 1024
+    local_cache_ttl: float = 5.0
+    cache_invalidation_channel: str = "cache-invalidation"
 
     second_app_host: str = "app2"
+    second_app_port: int = 8001
+    second_app_timeout: float = 5.0
+    second_app_connect_timeout: float = 1.0
+    second_app_retries: int = 2
+    second_app_coalesce_window_ms: float = 2.0
+    second_app_coalesce_max_batch_size: int = 50
+    second_app_batch_path: str | None = None
+
+    chain_target_url: str = "http://localhost:8000"
+    chain_timeout: float = 5.0
+    chain_retries: int = 0
+
+    executor_thread_workers: int = 8
+    executor_process_workers: int | None = None  # None - CPU поровну между воркерами
+    executor_max_queue: int = 100
+    executor_cpu_mode: str = "process"  # process | thread | inline
+
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False
+    http_backoff_base: float = 0.05
+    http_backoff_max: float = 1.0
+
+    @property
+    def workers_count(self) -> int:
+        return self.workers or os.cpu_count() or 1
 
     @property
-    def db_dsn(self) -> URL:
+    def worker_db_connections(self) -> int:
+        return self.database_pool_size + self.database_max_overflow + self.asyncpg_pool_max_size
+
+    @property
+    def process_workers(self) -> int:
+        # CPU делятся между воркерами, иначе процессов пула становится workers x CPU
+        return self.executor_process_workers or max(1, (os.cpu_count() or 1) // self.workers_count)
+
+    @property
+    def db_dsn(self) -> "URL":
+        # SQLAlchemy импортируется только когда DSN нужен (мастер-процесс launcher'а его не трогает)
+        from sqlalchemy.engine.url import URL
+
         return URL.create(
             self.db_driver,
             self.postgres_user,
@@ -36,5 +201,10 @@ class Settings(BaseSettings):
             self.postgres_database,
         )
 
+    @property
+    def asyncpg_dsn(self) -> str:
+        # asyncpg не понимает драйвер "postgresql+asyncpg" в схеме
+        return self.db_dsn.set(drivername="postgresql").render_as_string(hide_password=False)
+
 
 settings = Settings()
@@ -0,0 +1,391 @@
+"""
+Спул спанов на диск, пока коллектор недоступен или тормозит.
+
+Батч, который не удалось экспортировать, сериализуется в OTLP (ExportTraceServiceRequest) и дописывается
+в сегмент на диске. Запись: заголовок <длина, число спанов, crc32> и payload; сегмент закрывается
+по размеру, общий объём ограничен - при переполнении удаляются самые старые сегменты.
+Фоновый поток читает закрытые сегменты через mmap и досылает их в коллектор с лимитом спанов в секунду,
+поэтому спаны не копятся в памяти воркера и переживают рестарт коллектора (и воркера - сегменты
+остаются в каталоге и подбираются при следующем старте)
+"""
+
+import fcntl
+import itertools
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import weakref
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import BinaryIO, Iterator, Protocol, Sequence
+
+from opentelemetry import metrics
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from otel_py_example.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+meter = metrics.get_meter(__name__)
+
+spooled_counter = meter.create_counter("otel.exporter.spool.spooled", description="Spans written to the disk spool")
+replayed_counter = meter.create_counter(
+    "otel.exporter.spool.replayed", description="Spans replayed from the disk spool to the collector"
+)
+dropped_bytes_counter = meter.create_counter(
+    "otel.exporter.spool.dropped", unit="By", description="Spool bytes dropped because the spool was full or corrupted"
+)
+
+# длина payload, число спанов, crc32 payload
+RECORD_HEADER = struct.Struct("<III")
+SEGMENT_SUFFIX = ".spool"
+LOCK_FILE = ".lock"
+BASE_LOCK_FILE = ".adopt.lock"
+
+
+class PayloadSender(Protocol):
+    def send(self, payload: bytes) -> bool: ...
+
+    def close(self) -> None: ...
+
+
+def segment_name(seq: int) -> str:
+    return f"{seq:012d}{SEGMENT_SUFFIX}"
+
+
+def iter_records(buffer: mmap.mmap, offset: int) -> Iterator[tuple[int, int, bytes]]:
+    """
+    (смещение следующей записи, число спанов, payload). Недописанный или битый хвост
+    (воркер упал посреди записи) заканчивает чтение сегмента
+    """
+    size = len(buffer)
+    while offset + RECORD_HEADER.size <= size:
+        length, spans, crc = RECORD_HEADER.unpack_from(buffer, offset)
+        start = offset + RECORD_HEADER.size
+        end = start + length
+        if end > size:
+            return
+        payload = buffer[start:end]
+        if zlib.crc32(payload) != crc:
+            return
+        offset = end
+        yield offset, spans, payload
+
+
+class SpanSpool:
+    """
+    Append-only сегменты в каталоге воркера. Пишет один поток экспорта, читает поток досылки;
+    состояние сегментов под общим локом, сам payload читается вне лока
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, segment_bytes: int):
+        self.base = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+
+        self._lock = threading.Lock()
+        self._closed: deque[int] = deque()
+        self._sizes: dict[int, int] = {}
+        self._active: BinaryIO | None = None
+        self._active_seq = 0
+
+        self.base.mkdir(parents=True, exist_ok=True)
+        # Создание своего каталога и разбор брошенных - под общим локом базового каталога: иначе сосед,
+        # стартующий одновременно, может забрать и удалить каталог до того, как мы его заблокируем
+        with open(self.base / BASE_LOCK_FILE, "a") as base_lock:
+            fcntl.flock(base_lock, fcntl.LOCK_EX)
+            self.directory, self._lock_file = self._lock_own_directory()
+            self._adopt_orphans()
+
+    def _lock_own_directory(self) -> tuple[Path, BinaryIO]:
+        # Лок каталога держится всё время жизни воркера: по нему соседи отличают брошенные каталоги.
+        # Занят живым процессом с тем же pid (общий каталог у нескольких контейнеров) - берём другое имя
+        for attempt in itertools.count():
+            suffix = f"-{attempt}" if attempt else ""
+            directory = self.base / f"worker-{os.getpid()}{suffix}"
+            directory.mkdir(exist_ok=True)
+            lock_file = open(directory / LOCK_FILE, "a")  # noqa: SIM115
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            return directory, lock_file
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._total()
+
+    @property
+    def pending(self) -> bool:
+        with self._lock:
+            return bool(self._sizes)
+
+    def _total(self) -> int:
+        # Только под self._lock (или до старта потоков, в конструкторе)
+        return sum(self._sizes.values())
+
+    def _adopt_orphans(self) -> None:
+        # Сегменты своих прошлых запусков и упавших воркеров: pid новый, поэтому забираем все
+        # каталоги, лок которых никто не держит. Свой каталог (pid мог повториться) - первым,
+        # номера сегментов при переименовании только уменьшаются и не затирают соседей
+        for segment in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}")):
+            self._adopt_segment(segment)
+        for directory in sorted(self.base.glob("worker-*")):
+            if directory == self.directory:
+                continue
+            try:
+                self._adopt_directory(directory)
+            except OSError:
+                # Каталог исчез или недоступен - не повод ронять старт воркера
+                logger.warning("Span spool: skipping %s", directory, exc_info=True)
+        if self._sizes:
+            logger.info("Span spool: %d segments, %d bytes to replay", len(self._sizes), self._total())
+        self._trim()
+
+    def _adopt_directory(self, directory: Path) -> None:
+        with open(directory / LOCK_FILE, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            for segment in sorted(directory.glob(f"*{SEGMENT_SUFFIX}")):
+                self._adopt_segment(segment)
+            (directory / LOCK_FILE).unlink(missing_ok=True)
+        try:
+            directory.rmdir()
+        except OSError:
+            pass
+
+    def _adopt_segment(self, segment: Path) -> None:
+        size = segment.stat().st_size
+        if size == 0:
+            segment.unlink()
+            return
+        self._active_seq += 1
+        target = self.directory / segment_name(self._active_seq)
+        if segment != target:
+            segment.rename(target)
+        self._closed.append(self._active_seq)
+        self._sizes[self._active_seq] = size
+
+    def append(self, payload: bytes, spans: int) -> None:
+        record = RECORD_HEADER.pack(len(payload), spans, zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._active is None:
+                self._active_seq += 1
+                self._active = open(self.directory / segment_name(self._active_seq), "ab")  # noqa: SIM115
+                self._sizes[self._active_seq] = 0
+            self._active.write(record)
+            # Без fsync: от падения процесса защищает flush, от падения ОС - нет
+            self._active.flush()
+            self._sizes[self._active_seq] += len(record)
+            if self._sizes[self._active_seq] >= self.segment_bytes:
+                self._close_active()
+            self._trim()
+
+    def _close_active(self) -> None:
+        if self._active is None:
+            return
+        self._active.close()
+        self._active = None
+        self._closed.append(self._active_seq)
+
+    def _trim(self) -> None:
+        while self._total() > self.max_bytes and self._closed:
+            seq = self._closed.popleft()
+            dropped_bytes_counter.add(self._sizes.pop(seq))
+            (self.directory / segment_name(seq)).unlink(missing_ok=True)
+
+    def oldest(self) -> int | None:
+        """
+        Самый старый закрытый сегмент; если закрытых нет - закрывает активный, чтобы досылать и его
+        """
+        with self._lock:
+            if not self._closed and self._active is not None and self._sizes[self._active_seq] > 0:
+                self._close_active()
+            return self._closed[0] if self._closed else None
+
+    def contains(self, seq: int) -> bool:
+        with self._lock:
+            return seq in self._sizes
+
+    def read(self, seq: int, offset: int) -> Iterator[tuple[int, int, bytes]]:
+        with (
+            open(self.directory / segment_name(seq), "rb") as file,
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer,
+        ):
+            yield from iter_records(buffer, offset)
+
+    def remove(self, seq: int, offset: int) -> None:
+        with self._lock:
+            if seq not in self._sizes:
+                return
+            size = self._sizes.pop(seq)
+            if offset < size:
+                # Битый хвост сегмента
+                dropped_bytes_counter.add(size - offset)
+            self._closed.remove(seq)
+            (self.directory / segment_name(seq)).unlink(missing_ok=True)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._active is not None:
+                self._active.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_active()
+            empty = not self._sizes
+        if empty:
+            (self.directory / LOCK_FILE).unlink(missing_ok=True)
+        self._lock_file.close()
+        if empty:
+            try:
+                self.directory.rmdir()
+            except OSError:
+                pass
+
+
+class SpoolingSpanExporter(SpanExporter):
+    """
+    Экспорт напрямую в коллектор, а при ошибке или медленном экспорте - в спул на диск.
+
+    После сбоя батчи сразу уходят на диск, не дожидаясь таймаута экспортёра, и очередь
+    BatchSpanProcessor не переполняется. Фоновый поток досылает спул через sender (готовый payload,
+    без повторной сериализации) и только он проверяет коллектор: прямой экспорт открывается
+    после успешной досылки (или через retry_interval, если спул пуст)
+    """
+
+    def __init__(self, delegate: SpanExporter, sender: PayloadSender, spool: SpanSpool, name: str, settings: Settings):
+        self.delegate = delegate
+        self.sender = sender
+        self.spool = spool
+        self.attributes = {"exporter": name}
+        self.retry_interval = settings.otlp_spool_retry_interval
+        self.slow_export_millis = settings.otlp_spool_slow_export_millis
+        self.replay_rate = settings.otlp_spool_replay_rate
+
+        self._down_until = 0.0
+        # Доступность коллектора подтверждена досылкой (до этого со спулом напрямую не экспортируем)
+        self._collector_up = False
+        # seq -> досланная часть сегмента
+        self._offsets: dict[int, int] = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._replay_loop, name="OtelSpanSpoolReplay", daemon=True)
+        self._thread.start()
+        spooling_exporters.add(self)
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        if self._direct_export_allowed():
+            started = time.perf_counter()
+            result = self.delegate.export(spans)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if result == SpanExportResult.SUCCESS:
+                if self.slow_export_millis and elapsed_ms > self.slow_export_millis:
+                    # Батч доставлен, но следующие не ждут медленный коллектор
+                    self._mark_down()
+                return result
+            self._mark_down()
+
+        try:
+            self.spool.append(encode_spans(spans).SerializeToString(), len(spans))
+        except OSError:
+            logger.exception("Span spool write failed, %d spans lost", len(spans))
+            return SpanExportResult.FAILURE
+        spooled_counter.add(len(spans), self.attributes)
+        self._wake.set()
+        return SpanExportResult.SUCCESS
+
+    def _direct_export_allowed(self) -> bool:
+        if time.monotonic() < self._down_until:
+            return False
+        # Пока в спуле есть недосланное, коллектор проверяет только поток досылки: пробный прямой экспорт
+        # к лежащему коллектору держал бы поток BatchSpanProcessor до таймаута, а его очередь переполнялась
+        return not self.spool.pending or self._collector_up
+
+    def _mark_down(self) -> None:
+        self._collector_up = False
+        self._down_until = time.monotonic() + self.retry_interval
+
+    def _replay_loop(self) -> None:
+        while not self._stop.is_set():
+            seq = self.spool.oldest() if self.spool.pending else None
+            if seq is None:
+                self._wake.wait(self.retry_interval)
+                self._wake.clear()
+                continue
+            if not self._replay_segment(seq):
+                self._stop.wait(self.retry_interval)
+
+    def _replay_segment(self, seq: int) -> bool:
+        # Позиция в сегменте только в памяти: после падения воркера недосланный сегмент
+        # отправится заново с начала (at-least-once, дубли спанов бэкенд переживает)
+        offset = self._offsets.get(seq, 0)
+        tokens, refilled = self.replay_rate, time.monotonic()
+        for next_offset, spans, payload in self.spool.read(seq, offset):
+            if self._stop.is_set() or not self.spool.contains(seq):
+                return True
+            if self.replay_rate > 0:
+                now = time.monotonic()
+                tokens = min(self.replay_rate, tokens + (now - refilled) * self.replay_rate)
+                refilled = now
+                if tokens < spans:
+                    wait = (spans - tokens) / self.replay_rate
+                    if self._stop.wait(wait):
+                        return True
+                    tokens, refilled = spans, time.monotonic()
+                tokens -= spans
+            if not self.sender.send(payload):
+                self._offsets[seq] = offset
+                self._mark_down()
+                return False
+            # Коллектор принимает - снова экспортируем напрямую
+            self._collector_up = True
+            self._down_until = 0.0
+            replayed_counter.add(spans, self.attributes)
+            offset = next_offset
+        self._offsets.pop(seq, None)
+        self.spool.remove(seq, offset)
+        return True
+
+    def shutdown(self) -> None:
+        # Недосланное остаётся на диске до следующего старта
+        spooling_exporters.discard(self)
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=self.retry_interval)
+        self.spool.close()
+        self.sender.close()
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        self.spool.flush()
+        return self.delegate.force_flush(timeout_millis)
+
+
+# Живые экспортёры всех бэкендов: один gauge на процесс, как otel.exporter.queue.size
+spooling_exporters: "weakref.WeakSet[SpoolingSpanExporter]" = weakref.WeakSet()
+
+
+def observe_spool_size(options):
+    return [metrics.Observation(exporter.spool.size, exporter.attributes) for exporter in list(spooling_exporters)]
+
+
+meter.create_observable_gauge(
+    "otel.exporter.spool.size", callbacks=[observe_spool_size], unit="By", description="Bytes waiting in the span spool"
+)
+
+
+def spool_directory(settings: Settings, endpoint: str) -> Path:
+    # Свой каталог на каждый бэкенд fan-out'а
+    return Path(settings.otlp_spool_dir) / re.sub(r"[^A-Za-z0-9_.-]+", "_", endpoint).strip("_")
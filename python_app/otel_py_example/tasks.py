@@ -0,0 +1,23 @@
+"""
+Функции, которые выполняются в пулах executors.py (должны импортироваться из дочернего процесса)
+"""
+
+import time
+
+from opentelemetry import trace
+
+tracer = trace.get_tracer(__name__)
+
+
+def blocking_io(duration: float) -> str:
+    with tracer.start_as_current_span("blocking io"):
+        time.sleep(duration)
+    return "IO bound task finish!"
+
+
+def cpu_bound(iterations: int) -> str:
+    with tracer.start_as_current_span("cpu bound") as span:
+        span.set_attribute("iterations", iterations)
+        for i in range(iterations):
+            _ = i * i * i
+    return "CPU bound task finish!"
@@ -1,18 +1,20 @@
-from opentelemetry import trace
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry import metrics, trace
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.sdk.metrics import MeterProvider, TraceBasedExemplarFilter
+from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.instrumentation.asyncpg import AsyncPGInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
 
 from starlette.types import ASGIApp
 
+from otel_py_example.exporting import build_span_processor, create_metric_exporter
+from otel_py_example.sampling import build_sampler, wrap_processor
+from otel_py_example.settings import Settings, settings as default_settings
 
-def setting_otlp(
-    app: ASGIApp, app_name: str, endpoint: str, log_correlation: bool = True
-) -> None:
+
+def create_tracer_provider(app_name: str, endpoint: str, settings: Settings = default_settings) -> TracerProvider:
     # Setting OpenTelemetry
     # set the service name to show in traces
     resource = Resource.create(
@@ -20,13 +22,41 @@ def setting_otlp(
     )
 
     # set the tracer provider
-    tracer = TracerProvider(resource=resource)
+    tracer = TracerProvider(resource=resource, sampler=build_sampler(settings))
     trace.set_tracer_provider(tracer)
 
 
-    tracer.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    tracer.add_span_processor(wrap_processor(build_span_processor(endpoint, settings), settings))
+    return tracer
+
+
+def setting_metrics(app_name: str, endpoint: str, settings: Settings = default_settings) -> MeterProvider:
+    resource = Resource.create(
+        attributes={"service.name": app_name, "compose_service": app_name}
+    )
+    reader = PeriodicExportingMetricReader(
+        create_metric_exporter(endpoint, settings),
+        export_interval_millis=settings.metrics_export_interval_millis,
+    )
+    # Exemplar (trace_id/span_id) прикладывается к измерению, если оно записано внутри семплированного спана
+    meter_provider = MeterProvider(
+        resource=resource, metric_readers=[reader], exemplar_filter=TraceBasedExemplarFilter()
+    )
+    metrics.set_meter_provider(meter_provider)
+    return meter_provider
+
+
+def setting_otlp(
+    app_name: str, endpoint: str, log_correlation: bool = True, settings: Settings = default_settings
+) -> TracerProvider:
+    tracer = create_tracer_provider(app_name, endpoint, settings)
 
-    FastAPIInstrumentor.instrument_app(app, tracer_provider=tracer)
     AsyncPGInstrumentor().instrument(tracer_provider=tracer)
     HTTPXClientInstrumentor().instrument(tracer_provider=tracer)
     return tracer
+
+
+def instrument_app(app: ASGIApp) -> None:
+    # Middleware берёт глобальный (proxy) провайдер, поэтому сам TracerProvider
+    # можно создать позже, в lifespan воркера
+    FastAPIInstrumentor.instrument_app(app)
@@ -0,0 +1,85 @@
+"""
+AIMD лимит AdaptiveLimiter на заданных латентностях: без event loop и часов
+"""
+
+import random
+
+from otel_py_example.admission import AdaptiveLimiter
+
+
+def make_limiter(initial: int = 20) -> AdaptiveLimiter:
+    return AdaptiveLimiter(initial=initial, min_limit=1, max_limit=1000, tolerance=2.0, backoff=0.5)
+
+
+def idle(limiter: AdaptiveLimiter, latencies) -> None:
+    # По одному запросу: лимит не используется, латентность идёт в базовую
+    for latency in latencies:
+        assert limiter.try_acquire()
+        limiter.release(latency)
+
+
+def burst(limiter: AdaptiveLimiter, latencies) -> list[float]:
+    """
+    Занимает весь лимит, затем завершает запросы по одному; лимит после каждого завершения
+    """
+    admitted = 0
+    while limiter.try_acquire():
+        admitted += 1
+    limits = []
+    for latency in latencies[:admitted]:
+        limiter.release(latency)
+        limits.append(limiter.limit)
+    return limits
+
+
+def decreases(limits: list[float], start: float) -> int:
+    previous, count = start, 0
+    for limit in limits:
+        if limit < previous:
+            count += 1
+        previous = limit
+    return count
+
+
+def test_backoff_once_per_window():
+    limiter = make_limiter()
+    idle(limiter, [10.0] * 50)
+    assert limiter.limit == 20
+
+    # Очередь: все 20 запросов окна завершаются медленно, лимит уменьшается один раз, а не на каждом
+    limits = burst(limiter, [100.0] * 20)
+    assert decreases(limits, 20) == 1
+    assert int(limiter.limit) == 10
+
+    # Следующее окно - ещё одно уменьшение
+    limits = burst(limiter, [100.0] * 10)
+    assert decreases(limits, 10) == 1
+    assert int(limiter.limit) == 5
+
+
+def test_grows_only_while_utilized():
+    limiter = make_limiter()
+    idle(limiter, [10.0] * 500)
+    # Простаивающий лимит не растёт, иначе при всплеске нагрузки защиты нет
+    assert limiter.limit == 20
+
+    for _ in range(20):
+        burst(limiter, [10.0] * 1000)
+    assert limiter.limit > 25
+
+
+def test_load_independent_latency_keeps_limit():
+    # Как /random_sleep: латентность случайная, но от числа одновременных запросов не зависит
+    rng = random.Random(42)
+
+    def latencies(count: int) -> list[float]:
+        return [rng.uniform(0, 1000) for _ in range(count)]
+
+    limiter = make_limiter()
+    idle(limiter, latencies(200))
+
+    limits = []
+    for _ in range(50):
+        limits += burst(limiter, latencies(1000))
+    assert decreases(limits, 20) == 0
+    assert limiter.limit >= 20
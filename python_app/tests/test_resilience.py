@@ -0,0 +1,209 @@
+"""
+Circuit breaker, бюджет ретраев и дедлайн запроса - без внешних зависимостей
+"""
+
+import asyncio
+
+import pytest
+
+from otel_py_example.repository.cache import SingleFlight
+from otel_py_example.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    Policy,
+    RetryBudget,
+    deadline_scope,
+    remaining,
+)
+
+
+def make_policy(threshold: int = 2, retries: int = 0, budget: RetryBudget | None = None) -> Policy:
+    return Policy(
+        "test",
+        CircuitBreaker("test", failure_threshold=threshold, recovery_timeout=10),
+        budget or RetryBudget(max_tokens=10, token_ratio=0.1),
+        (ConnectionError,),
+        retries=retries,
+        backoff_base=0.001,
+        backoff_max=0.001,
+    )
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.on_failure()
+
+
+def expire_recovery(breaker: CircuitBreaker) -> None:
+    breaker.opened_at -= breaker.recovery_timeout
+
+
+def test_breaker_transitions():
+    breaker = CircuitBreaker("transitions", failure_threshold=2, recovery_timeout=10)
+    breaker.on_failure()
+    assert breaker.state == CLOSED
+    # Успех обнуляет счётчик: открывают только сбои подряд
+    breaker.on_success()
+    breaker.on_failure()
+    assert breaker.state == CLOSED
+
+    breaker.on_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert 0 < error.value.retry_after <= 10
+
+    expire_recovery(breaker)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Пока идёт проба, остальные вызовы отклоняются
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.on_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker("probe", failure_threshold=3, recovery_timeout=10)
+    open_breaker(breaker)
+    expire_recovery(breaker)
+    breaker.before_call()
+    breaker.on_failure()
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_cancelled_probe_is_released():
+    policy = make_policy()
+    open_breaker(policy.breaker)
+    expire_recovery(policy.breaker)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.Event().wait()
+
+        probe = asyncio.create_task(policy.call(hang))
+        await started.wait()
+        assert policy.breaker.probes == 1
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(scenario())
+    assert policy.breaker.state == HALF_OPEN
+    assert policy.breaker.probes == 0
+    # Место пробы свободно: следующий вызов проходит
+    policy.breaker.before_call()
+
+
+def test_request_deadline_is_not_a_dependency_failure():
+    policy = make_policy(threshold=1)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def scenario():
+        async with deadline_scope(0.05):
+            await policy.call(slow)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert policy.breaker.state == CLOSED
+    assert policy.breaker.failures == 0
+    assert policy.budget.tokens == policy.budget.max_tokens
+
+
+def test_dependency_timeout_is_a_failure():
+    policy = make_policy(threshold=1)
+
+    async def timed_out():
+        raise TimeoutError
+
+    with pytest.raises(TimeoutError) as error:
+        asyncio.run(policy.call(timed_out))
+    assert not isinstance(error.value, DeadlineExceeded)
+    assert policy.breaker.state == OPEN
+
+
+def test_expired_deadline_fails_before_calling():
+    policy = make_policy()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+
+    async def scenario():
+        async with deadline_scope(0):
+            await policy.call(call)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert calls == 0
+
+
+def test_retry_budget_exhaustion():
+    budget = RetryBudget(max_tokens=10, token_ratio=0.5)
+    policy = make_policy(threshold=100, retries=3, budget=budget)
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(policy.call(failing))
+    assert calls == 4
+    assert budget.tokens == 6
+
+    # Токенов не больше половины - ретраев нет, только сама попытка
+    calls = 0
+    with pytest.raises(ConnectionError):
+        asyncio.run(policy.call(failing))
+    assert calls == 1
+    assert not budget.allow_retry()
+
+    # Успехи возвращают по token_ratio
+    for _ in range(2):
+        budget.on_success()
+    assert budget.allow_retry()
+
+
+def test_single_flight_load_outlives_first_caller_deadline():
+    single_flight = SingleFlight()
+    loads = []
+
+    async def load():
+        # Общая загрузка идёт без дедлайна запроса, который её запустил
+        loads.append(remaining())
+        await asyncio.sleep(0.2)
+        return "value"
+
+    async def with_deadline():
+        async with deadline_scope(0.05):
+            return await single_flight.do("key", load)
+
+    async def scenario():
+        first = asyncio.create_task(with_deadline())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(single_flight.do("key", load))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    assert isinstance(first, DeadlineExceeded)
+    assert second == "value"
+    assert loads == [None]
@@ -0,0 +1,230 @@
+"""
+Спул спанов без коллектора: формат записей, обрезка по объёму, подбор брошенных каталогов и досылка
+"""
+
+import time
+import zlib
+from pathlib import Path
+
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from otel_py_example.settings import Settings
+from otel_py_example.spool import (
+    RECORD_HEADER,
+    SpanSpool,
+    SpoolingSpanExporter,
+    observe_spool_size,
+    segment_name,
+)
+
+
+def make_spool(base: Path, max_bytes: int = 1 << 20, segment_bytes: int = 1 << 20) -> SpanSpool:
+    return SpanSpool(base, max_bytes, segment_bytes)
+
+
+def read_all(spool: SpanSpool) -> list[tuple[int, bytes]]:
+    result = []
+    while (seq := spool.oldest()) is not None:
+        records = list(spool.read(seq, 0))
+        result.extend((spans, payload) for _, spans, payload in records)
+        spool.remove(seq, records[-1][0] if records else 0)
+    return result
+
+
+def record(payload: bytes, spans: int) -> bytes:
+    return RECORD_HEADER.pack(len(payload), spans, zlib.crc32(payload)) + payload
+
+
+def test_records_round_trip(tmp_path):
+    spool = make_spool(tmp_path)
+    spool.append(b"first", 1)
+    spool.append(b"second", 2)
+    assert spool.size == 2 * RECORD_HEADER.size + len(b"first") + len(b"second")
+
+    assert read_all(spool) == [(1, b"first"), (2, b"second")]
+    assert not spool.pending
+    spool.close()
+
+
+def test_torn_tail_ends_segment(tmp_path):
+    spool = make_spool(tmp_path)
+    spool.append(b"complete", 1)
+    spool.append(b"torn record", 1)
+    seq = spool.oldest()
+    # Воркер упал посреди записи: от второй записи остался заголовок и часть payload
+    path = spool.directory / segment_name(seq)
+    path.write_bytes(path.read_bytes()[:-4])
+
+    assert [payload for _, _, payload in spool.read(seq, 0)] == [b"complete"]
+    spool.close()
+
+
+def test_crc_mismatch_ends_segment(tmp_path):
+    spool = make_spool(tmp_path)
+    spool.append(b"good", 1)
+    spool.append(b"corrupted", 1)
+    spool.append(b"after", 1)
+    seq = spool.oldest()
+    path = spool.directory / segment_name(seq)
+    data = bytearray(path.read_bytes())
+    data[len(record(b"good", 1)) + RECORD_HEADER.size] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    records = list(spool.read(seq, 0))
+    assert [payload for _, _, payload in records] == [b"good"]
+    # Битый хвост при удалении сегмента считается потерянным
+    spool.remove(seq, records[-1][0])
+    assert not spool.pending
+    spool.close()
+
+
+def test_trim_drops_oldest_segments(tmp_path):
+    payload = b"x" * 100
+    size = len(record(payload, 1))
+    # Каждая запись закрывает сегмент, в лимит помещаются три
+    spool = make_spool(tmp_path, max_bytes=3 * size, segment_bytes=size)
+    for i in range(6):
+        spool.append(payload[:-1] + bytes([i]), 1)
+
+    assert spool.size <= 3 * size
+    assert [payload[-1] for _, payload in read_all(spool)] == [3, 4, 5]
+    assert sorted(spool.directory.glob("*.spool")) == []
+    spool.close()
+
+
+def test_adopts_orphaned_worker_directories(tmp_path):
+    # Каталог упавшего воркера: сегменты есть, лок никто не держит
+    orphan = tmp_path / "worker-999999"
+    orphan.mkdir()
+    (orphan / segment_name(1)).write_bytes(record(b"orphan-1", 1))
+    (orphan / segment_name(2)).write_bytes(record(b"orphan-2", 3))
+    (orphan / segment_name(3)).write_bytes(b"")
+
+    spool = make_spool(tmp_path)
+
+    assert not orphan.exists()
+    assert spool.size == len(record(b"orphan-1", 1)) + len(record(b"orphan-2", 3))
+    spool.append(b"own", 1)
+    assert read_all(spool) == [(1, b"orphan-1"), (3, b"orphan-2"), (1, b"own")]
+    spool.close()
+
+
+def test_skips_directory_locked_by_live_worker(tmp_path):
+    live = make_spool(tmp_path)
+    live.append(b"live", 1)
+    # Тот же pid, но лок каталога занят - второй спул берёт каталог с суффиксом и чужое не трогает
+    other = make_spool(tmp_path)
+
+    assert other.directory != live.directory
+    assert not other.pending
+    assert read_all(live) == [(1, b"live")]
+    other.close()
+    live.close()
+
+
+def test_spool_survives_restart(tmp_path):
+    spool = make_spool(tmp_path)
+    spool.append(b"before restart", 2)
+    spool.close()
+
+    restarted = make_spool(tmp_path)
+    assert read_all(restarted) == [(2, b"before restart")]
+    restarted.close()
+
+
+class FailingExporter(SpanExporter):
+    def __init__(self):
+        self.calls = 0
+
+    def export(self, spans):
+        self.calls += 1
+        return SpanExportResult.FAILURE
+
+    def shutdown(self):
+        pass
+
+
+class RecordingSender:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.payloads: list[bytes] = []
+
+    def send(self, payload: bytes) -> bool:
+        if self.failures:
+            self.failures -= 1
+            return False
+        self.payloads.append(payload)
+        return True
+
+    def close(self):
+        pass
+
+
+def finished_spans(*names: str) -> list:
+    provider = TracerProvider()
+    tracer = provider.get_tracer(__name__)
+    spans = []
+    for name in names:
+        span = tracer.start_span(name)
+        span.end()
+        spans.append(span)
+    return spans
+
+
+def span_names(payload: bytes) -> list[str]:
+    request = ExportTraceServiceRequest.FromString(payload)
+    return [
+        span.name
+        for resource_spans in request.resource_spans
+        for scope_spans in resource_spans.scope_spans
+        for span in scope_spans.spans
+    ]
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def spooling_exporter(tmp_path: Path, sender: RecordingSender, name: str = "collector") -> SpoolingSpanExporter:
+    settings = Settings(otlp_spool_retry_interval=0.2, otlp_spool_replay_rate=0)
+    return SpoolingSpanExporter(FailingExporter(), sender, make_spool(tmp_path / name), name, settings)
+
+
+def test_failed_batches_are_replayed(tmp_path):
+    # Первая досылка тоже падает: сегмент остаётся и уходит со следующей попытки
+    sender = RecordingSender(failures=1)
+    exporter = spooling_exporter(tmp_path, sender)
+    try:
+        assert exporter.export(finished_spans("a", "b")) == SpanExportResult.SUCCESS
+        assert exporter.export(finished_spans("c")) == SpanExportResult.SUCCESS
+        # После сбоя прямой экспорт не пробуется до retry_interval
+        assert exporter.delegate.calls == 1
+
+        assert wait_for(lambda: not exporter.spool.pending)
+        assert [span_names(payload) for payload in sender.payloads] == [["a", "b"], ["c"]]
+    finally:
+        exporter.shutdown()
+
+
+def test_size_gauge_reports_every_exporter(tmp_path):
+    # Коллектор лежит: батчи остаются на диске
+    first = spooling_exporter(tmp_path, RecordingSender(failures=1000), "first")
+    second = spooling_exporter(tmp_path, RecordingSender(failures=1000), "second")
+    try:
+        first.export(finished_spans("a"))
+        observed = {observation.attributes["exporter"]: observation.value for observation in observe_spool_size(None)}
+        assert observed["first"] > 0
+        assert observed["second"] == 0
+    finally:
+        first.shutdown()
+        second.shutdown()
+
+    exporters = {observation.attributes["exporter"] for observation in observe_spool_size(None)}
+    assert not exporters & {"first", "second"}
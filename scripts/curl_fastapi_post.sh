@@ -1,2 +1,2 @@
 #!/bin/bash
-curl -X POST "http://localhost:8000/zhopa/" -H "Content-Type: application/json" -d "{\"message\": \"Hello, World\"}"
\ No newline at end of file
+curl -X POST "http://localhost:8000/entities/" -H "Content-Type: application/json" -d "{\"name\": \"Hello\", \"description\": \"World\"}"
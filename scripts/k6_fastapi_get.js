@@ -6,8 +6,13 @@ export const options = {
     duration: '20s',
 };
 
+const BASE_URL = __ENV.BASE_URL || 'http://localhost:8000';
+const PATHS = ['/', '/entities/?limit=100', '/entities-asyncpg/?limit=100', '/redis-get/'];
+
 export default function () {
-    const res = http.get('http://localhost:8000/zhopa');
-    check(res, { 'status was 200': (r) => r.status == 200 });
+    for (const path of PATHS) {
+        const res = http.get(`${BASE_URL}${path}`);
+        check(res, { [`${path} status was 200`]: (r) => r.status == 200 });
+    }
     sleep(0.5);
 }
\ No newline at end of file